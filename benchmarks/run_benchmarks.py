@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+'''
+Benchmarks for two-eyes, timing (and measuring the peak memory of)
+loading, composing, and encoding stereographs, for synthetic
+pairs of images ranging from thumbnails up to 50 megapixels.
+
+Each benchmark runs in its own fresh process, so its peak memory
+can be measured without being confused by anything that came before.
+Results are saved as JSON, which can be compared to results from
+another commit, for example:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    (...make some changes...)
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+To compare the encode time and size of the animated formats:
+
+    python benchmarks/run_benchmarks.py --cases gif-per-frame-palette,to_animation-gif,to_animation-webp,to_animation-apng
+
+To time disparity maps:
+
+    python benchmarks/run_benchmarks.py --cases to_disparity --sizes 1MP,12MP
+
+To compare the encode time and size of each encoder preset, on the
+sample pair in `twoeyes/data` (as well as a synthetic one):
+
+    python benchmarks/run_benchmarks.py --cases presets --sizes sample,12MP
+'''
+import os, sys, io, json, time, platform, resource, subprocess, tempfile, optparse, tracemalloc, contextlib
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from PIL import Image
+
+# make sure we're benchmarking the code in this repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from twoeyes.version import __version__
+from twoeyes.stereo import Stereo, create_safe_filename, filename_counters
+from twoeyes.encode import available_presets
+from twoeyes.imports import data_directory
+
+# the sizes of synthetic image pairs, as (width, height) of each eye
+image_sizes = {'thumbnail': (400, 300),
+               '1MP': (1200, 900),
+               '12MP': (4000, 3000),
+               '24MP': (6000, 4000),
+               '50MP': (8660, 5773)}
+
+# the real pair of images that comes with two-eyes (as the 'sample' size)
+sample_pair = [os.path.join(data_directory, f'{eye}.jpg') for eye in ['left', 'right']]
+
+# how many files should be in a crowded directory?
+directory_sizes = {'1k-files': 1000,
+                   '50k-files': 50000}
+
+def make_synthetic_pair(directory, size):
+    '''
+    Write a synthetic left/right pair of JPEGs, with smooth structure
+    (like a photograph) plus some noise, and a shift between the eyes.
+    '''
+    filenames = [os.path.join(directory, f'{size[0]}x{size[1]}-{eye}.jpg') for eye in ['left', 'right']]
+    if all(os.path.exists(f) for f in filenames):
+        return filenames
+    rng = np.random.default_rng(42)
+    width, height = size
+    coarse = rng.integers(0, 256, (height//16 + 2, width//16 + 2, 3), dtype=np.uint8)
+    smooth = Image.fromarray(coarse).resize((width + 32, height + 32), Image.BILINEAR)
+    scene = np.asarray(smooth) + rng.integers(0, 16, (height + 32, width + 32, 3), dtype=np.uint8)
+    Image.fromarray(scene[16:16 + height, 16:16 + width]).save(filenames[0], quality=90)
+    Image.fromarray(scene[14:14 + height, 8:8 + width]).save(filenames[1], quality=90)
+    return filenames
+
+def case_load(pair, directory):
+    '''
+    Open and decode both eyes.
+    '''
+    def run():
+        s = Stereo(*pair)
+        for eye in ['left', 'right']:
+            s.images[eye].load()
+    return run
+
+def case_output(method, **kwargs):
+    '''
+    Make a benchmark for one of the `to_*` methods,
+    starting from images that have already been decoded.
+    '''
+    def case(pair, directory):
+        s = Stereo(*pair)
+        for eye in ['left', 'right']:
+            s.images[eye].load()
+        def run():
+            s.forget()
+            return getattr(s, method)(directory=directory, **kwargs)
+        return run
+    case.__doc__ = f'Make an output with `Stereo.{method}` from decoded images.'
+    return case
+
+def case_encode(method, preset):
+    '''
+    Make a benchmark for encoding the output of one of the `to_*`
+    methods with an encoder preset (composing it only once, first).
+    '''
+    def case(pair, directory):
+        s = Stereo(*pair)
+        image = getattr(s, method)(sink='image')
+        def run():
+            return s.save_output(image, 'encoded', 'jpg', directory=directory, preset=preset)
+        return run
+    case.__doc__ = f"Encode the output of `Stereo.{method}` with the '{preset}' preset."
+    return case
+
+def case_gif_per_frame_palette(pair, directory):
+    '''
+    Make an animated gif the old way, letting PIL quantize each full frame separately.
+    '''
+    s = Stereo(*pair)
+    for eye in ['left', 'right']:
+        s.images[eye].load()
+    def run():
+        filename = os.path.join(directory, 'per-frame-palette.gif')
+        s.images['left'].save(filename, save_all=True, append_images=[s.images['right']],
+                              optimize=True, duration=500, loop=0)
+        return filename
+    return run
+
+def case_filename(files, directory):
+    '''
+    Claim 10 new filenames, in a directory already containing `files` outputs.
+    '''
+    base = os.path.join(directory, 'stereograph-red-cyan.jpg')
+    for i in range(files):
+        open(os.path.join(directory, f'stereograph-red-cyan-{i:03.0f}.jpg'), 'w').close()
+    def run():
+        filename_counters.clear()
+        for i in range(10):
+            create_safe_filename(base)
+    return run
+
+# all the benchmarks for image pairs
+cases = {'load': case_load,
+         'to_sidebyside': case_output('to_sidebyside'),
+         'to_anaglyph': case_output('to_anaglyph'),
+         'to_gif': case_output('to_gif')}
+
+# benchmarks comparing animated formats (not run by default)
+animation_cases = {'gif-per-frame-palette': case_gif_per_frame_palette,
+                   'to_animation-gif': case_output('to_animation', format='gif'),
+                   'to_animation-gif-1000px': case_output('to_animation', format='gif', width=1000),
+                   'to_animation-webp': case_output('to_animation', format='webp'),
+                   'to_animation-apng': case_output('to_animation', format='apng')}
+cases.update(animation_cases)
+
+# benchmarks for analysis (not run by default)
+analysis_cases = {'to_disparity': case_output('to_disparity')}
+cases.update(analysis_cases)
+
+# benchmarks comparing encoder presets (not run by default, and
+# all run with `--cases presets`)
+preset_cases = {f'encode-{method[3:]}-{preset}': case_encode(method, preset)
+                for method in ['to_anaglyph', 'to_sidebyside'] for preset in available_presets()}
+cases.update(preset_cases)
+
+def read_memory(field):
+    '''
+    Read a memory statistic (like 'VmRSS' or 'VmHWM') for this
+    process from /proc, in MB (or None if this isn't linux).
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])/1024
+    except OSError:
+        return None
+
+def reset_peak_memory():
+    '''
+    Reset this process's peak resident memory, if possible (on linux).
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def measure(name, size, repeat, pair=None):
+    '''
+    Run one benchmark (inside a fresh process).
+
+    Returns
+    -------
+    result : dict
+        The time (best and median over `repeat` runs, in seconds),
+        and the peak memory (in MB) added by the first run, both as
+        resident memory and as allocations traced by Python.
+    '''
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        if name == 'create_safe_filename':
+            run = case_filename(directory_sizes[size], directory)
+        else:
+            run = cases[name](pair, directory)
+
+        # measure the memory of the first run, ideally as the peak
+        # above where we start, or otherwise as the growth in the peak
+        if reset_peak_memory():
+            before = read_memory('VmRSS')
+        else:
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/(1024**2 if sys.platform == 'darwin' else 1024)
+        tracemalloc.start()
+        start = time.perf_counter()
+        output = run()
+        times = [time.perf_counter() - start]
+        traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        after = read_memory('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/(1024**2 if sys.platform == 'darwin' else 1024)
+
+        # time the rest of the runs
+        for i in range(repeat - 1):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        # how big was the output?
+        output_bytes = os.path.getsize(output) if isinstance(output, str) else None
+
+    return dict(case=name, size=size,
+                seconds=min(times), median_seconds=float(np.median(times)), repeat=repeat,
+                peak_rss_mb=max(0, after - before),
+                peak_traced_mb=traced/1024**2, output_bytes=output_bytes)
+
+def describe_environment():
+    '''
+    Describe where these benchmarks were run.
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return dict(commit=commit, date=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                python=platform.python_version(), platform=platform.platform(),
+                numpy=np.__version__, pillow=Image.__version__, twoeyes=__version__)
+
+def compare(results, baseline, tolerance=1.2, noise=dict(seconds=0.005, peak_rss_mb=2)):
+    '''
+    Print how results compare to a baseline, and return the
+    benchmarks that got slower (or bigger) by more than `tolerance`
+    (ignoring differences smaller than the `noise`).
+    '''
+    previous = {(r['case'], r['size']): r for r in baseline['results']}
+    worse = []
+    print(f"\n{'case':>26} {'size':>10} {'time':>10} {'(ratio)':>8} {'memory':>10} {'(ratio)':>8}")
+    for r in results:
+        old = previous.get((r['case'], r['size']))
+        if old is None:
+            continue
+        ratios, flag = {}, ''
+        for k in ['seconds', 'peak_rss_mb']:
+            ratios[k] = (r[k] + noise[k])/(old[k] + noise[k])
+            if (ratios[k] > tolerance) and (r[k] - old[k] > noise[k]):
+                flag = ' <--'
+        print(f"{r['case']:>26} {r['size']:>10} {r['seconds']:>9.4f}s {ratios['seconds']:>8.2f} "
+              f"{r['peak_rss_mb']:>8.1f}MB {ratios['peak_rss_mb']:>8.2f}{flag}")
+        if flag:
+            worse.append(r)
+    return worse
+
+def main(args=None):
+    parser = optparse.OptionParser(usage='python benchmarks/run_benchmarks.py [options]')
+    parser.add_option('-s', '--sizes', default='thumbnail,1MP,12MP',
+        help=f"comma-separated image sizes, from {','.join(image_sizes)},sample [default: %default]")
+    defaults = [k for k in cases if (k not in animation_cases) and (k not in analysis_cases)
+                and (k not in preset_cases)] + ['create_safe_filename']
+    parser.add_option('-c', '--cases', default=','.join(defaults),
+        help='comma-separated benchmarks to run [default: %default]')
+    parser.add_option('-d', '--directories', default=','.join(directory_sizes),
+        help=f"comma-separated crowded directory sizes for create_safe_filename [default: %default]")
+    parser.add_option('-r', '--repeat', type='int', default=3,
+        help='how many times to run each benchmark [default: %default]')
+    parser.add_option('-o', '--output', default=None,
+        help='where to save the results [default: benchmarks/results/<commit>.json]')
+    parser.add_option('--compare', default=None,
+        help='a previous results file to compare against')
+    parser.add_option('--tolerance', type='float', default=1.2,
+        help='how much slower (or bigger) counts as a regression [default: %default]')
+    parser.add_option('--data', default=os.path.join(tempfile.gettempdir(), 'two-eyes-benchmark-data'),
+        help='where to keep the synthetic images [default: %default]')
+    options, args = parser.parse_args(args)
+
+    environment = describe_environment()
+    os.makedirs(options.data, exist_ok=True)
+    names = [x for x in options.cases.split(',') if x != '']
+    if 'presets' in names:
+        names += list(preset_cases)
+
+    # list every benchmark to run
+    todo = []
+    for size in [x for x in options.sizes.split(',') if x != '']:
+        if size == 'sample':
+            if not all(os.path.exists(f) for f in sample_pair):
+                print(f'Skipping the sample size, since there are no sample images in {data_directory}.')
+                continue
+            pair = sample_pair
+        else:
+            pair = make_synthetic_pair(options.data, image_sizes[size])
+        todo += [(name, size, pair) for name in names if name in cases]
+    if 'create_safe_filename' in names:
+        todo += [('create_safe_filename', size, None) for size in options.directories.split(',') if size != '']
+
+    # run each one in a fresh process
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for name, size, pair in todo:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(measure, name, size, options.repeat, pair).result()
+        results.append(result)
+        output = '' if result['output_bytes'] is None else f", output {result['output_bytes']/1024**2:.2f}MB"
+        print(f"{name:>26} {size:>10} {result['seconds']:>9.4f}s {result['peak_rss_mb']:>8.1f}MB "
+              f"(traced {result['peak_traced_mb']:.1f}MB{output})")
+
+    # save the results
+    output = options.output or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            'results', f"{environment['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(dict(environment=environment, results=results), f, indent=2)
+    print(f'Saved results to {output}')
+
+    # compare to a baseline
+    if options.compare is not None:
+        with open(options.compare) as f:
+            worse = compare(results, json.load(f), tolerance=options.tolerance)
+        return 1 if len(worse) > 0 else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import optparse
+from twoeyes import Stereo
 
 #s = Stereo('couchtest/left.jpg','couchtest/right.jpg')
 if __name__ == '__main__':
@@ -27,7 +28,7 @@ Options:
 
     # create the stereo image
     print("Creating a stereo image from your two input images!")
-    s = Stereo(*args)
+    s = Stereo(*args, verbose=True)
 
 
     # unless the "--auto" option is set,
@@ -35,9 +36,7 @@ Options:
         s.adjust()
 
     # create a side-by-side image
-    sbs = SideBySide(s)
-    sbs.display()
+    s.to_sidebyside()
 
-    # create a blue-red image
-    a = Anaglyph(s)
-    a.display()
+    # create a red-cyan image
+    s.to_anaglyph()
@@ -71,6 +71,9 @@ setup(
     include_package_data=True,
     # are there scripts to be copied into your $PATH?
     scripts = [],
+    # what commands should be installed to run functions in the package?
+    entry_points = {'console_scripts': ['two-eyes-batch=twoeyes.batch:main',
+                                        'two-eyes-server=twoeyes.server:main']},
     # some descriptions about this package (for searchability)
     classifiers=[
       'Intended Audience :: Education',
@@ -83,10 +86,10 @@ setup(
                       'scipy',
                       'matplotlib',
                       'ipywidgets>=7.5.1', 
-                      'pillow', 
+                      'pillow>=9.1', 
                       'pillow-heif'],
     # what version of Python is required?
-    python_requires='>=3.6',
+    python_requires='>=3.9',
     # requirements in `key` will install with `pip install the-cheerful-camera[key]`
     extras_require={},
     # (I think just leave this set to False)
@@ -0,0 +1,23 @@
+import os, pytest
+import numpy as np
+from PIL import Image
+
+def make_pair(directory, name='synthetic', shape=(120, 160), shift=(2, 5), extension='jpg'):
+    '''
+    Write a synthetic left/right pair, where the right image is
+    the left image shifted by `shift` = (rows, columns).
+    '''
+    rng = np.random.default_rng(42)
+    height, width = shape
+    big = rng.integers(0, 256, (height + 20, width + 20, 3), dtype=np.uint8)
+    left = big[10:10 + height, 10:10 + width]
+    right = big[10 - shift[0]:10 - shift[0] + height, 10 - shift[1]:10 - shift[1] + width]
+    filenames = {}
+    for eye, array in zip(['left', 'right'], [left, right]):
+        filenames[eye] = os.path.join(directory, f'{name}-{eye}.{extension}')
+        Image.fromarray(np.ascontiguousarray(array)).save(filenames[eye])
+    return filenames['left'], filenames['right']
+
+@pytest.fixture
+def pair(tmp_path):
+    return make_pair(str(tmp_path))
@@ -0,0 +1,22 @@
+import numpy as np
+from twoeyes import Stereo
+from twoeyes.align import estimate_offset
+from conftest import make_pair
+
+def test_adjust(tmp_path):
+    for shift in [(2, 5), (-7, 3), (0, -9)]:
+        left, right = make_pair(str(tmp_path), shape=(300, 400), shift=shift, extension='png')
+        s = Stereo(left, right)
+        assert s.adjust() == (shift[1], shift[0])
+        assert s.images['left'].size == (400 - abs(shift[1]), 300 - abs(shift[0]))
+        assert (np.array(s.images['left']) == np.array(s.images['right'])).all()
+
+def test_estimate_offset_pyramid():
+    # a smooth scene, big enough to need several pyramid levels
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:1300, 0:1800]
+    scene = sum(np.sin(x/p + rng.uniform(0, 6))*np.cos(y/q + rng.uniform(0, 6))
+                for p, q in rng.uniform(5, 60, (20, 2)))
+    scene = ((scene - scene.min())/np.ptp(scene)*255).astype(np.uint8)
+    left, right = scene[100:1200, 100:1700], scene[83:1183, 137:1737]
+    assert estimate_offset(left, right) == (-37, 17)
@@ -0,0 +1,57 @@
+import os, multiprocessing, pytest
+import twoeyes.batch
+from twoeyes.batch import find_pairs, read_manifest, render_pairs, main
+from conftest import make_pair
+
+def test_render_pairs(tmp_path, capsys):
+    source = tmp_path / 'source'
+    source.mkdir()
+    for name in ['a', 'b']:
+        make_pair(str(source), name=name)
+    (source / 'broken-left.jpg').write_bytes(b'not an image')
+    (source / 'broken-right.jpg').write_bytes(b'not an image')
+    (source / 'lonely-left.jpg').write_bytes(b'no partner')
+
+    pairs = find_pairs(str(source))
+    assert [p['name'] for p in pairs] == ['a', 'b', 'broken']
+
+    output = str(tmp_path / 'output')
+    results = render_pairs(pairs, outputs=['anaglyph', 'sidebyside'], directory=output, processes=2)
+    assert [r['error'] is None for r in results] == [True, True, False]
+    for r in results[:2]:
+        for filename in r['outputs'].values():
+            assert os.path.exists(filename)
+
+    # the library is quiet (only the command line prints progress)
+    assert capsys.readouterr().out == ''
+    find_pairs(str(source), verbose=True)
+    assert 'skipping lonely' in capsys.readouterr().out
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='the crash is patched in by forking')
+def test_crashing_pair(tmp_path, monkeypatch):
+    # make the worker for one pair die completely (like a segfault would)
+    real = twoeyes.batch.Stereo
+    def crashy(left, right, **kwargs):
+        if kwargs.get('prefix') == 'crash':
+            os._exit(1)
+        return real(left, right, **kwargs)
+    monkeypatch.setattr(twoeyes.batch, 'Stereo', crashy)
+
+    pairs = []
+    for name in ['a', 'b', 'crash', 'c', 'd', 'e']:
+        left, right = make_pair(str(tmp_path), name=name)
+        pairs.append(dict(name=name, left=left, right=right))
+    results = render_pairs(pairs, outputs=['anaglyph'], directory=str(tmp_path / 'output'), processes=2)
+    assert [r['error'] is None for r in results] == [True, True, False, True, True, True]
+    assert 'BrokenProcessPool' in results[2]['error']
+    assert all(os.path.exists(f) for r in results if r['error'] is None for f in r['outputs'].values())
+
+def test_manifest(tmp_path):
+    left, right = make_pair(str(tmp_path), name='x')
+    manifest = tmp_path / 'manifest.csv'
+    manifest.write_text('left,right,name\n# a comment\n\nx-left.jpg,x-right.jpg,first\nx-left.jpg,missing.jpg\n')
+    pairs = read_manifest(str(manifest))
+    assert [p['name'] for p in pairs] == ['first', 'x']
+    assert pairs[0]['left'] == left
+    status = main([str(manifest), '-d', str(tmp_path / 'output'), '-p', '1', '-o', 'gif'])
+    assert status == 1
@@ -0,0 +1,17 @@
+import os, sys, json, subprocess
+
+script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'run_benchmarks.py')
+
+def test_benchmarks_run(tmp_path):
+    output = str(tmp_path / 'results.json')
+    options = ['-s', 'thumbnail', '-c', 'load,to_anaglyph,create_safe_filename', '-d', '1k-files',
+               '-r', '1', '--data', str(tmp_path)]
+    subprocess.run([sys.executable, script, '-o', output] + options, check=True, capture_output=True)
+    results = json.load(open(output))['results']
+    assert [(r['case'], r['size']) for r in results] == [('load', 'thumbnail'),
+                                                         ('to_anaglyph', 'thumbnail'),
+                                                         ('create_safe_filename', '1k-files')]
+    assert all(r['seconds'] > 0 for r in results)
+    compared = subprocess.run([sys.executable, script, '-o', str(tmp_path / 'again.json'),
+                               '--compare', output, '--tolerance', '100'] + options, capture_output=True)
+    assert compared.returncode == 0
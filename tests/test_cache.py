@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from twoeyes import Stereo, Tracer
+from twoeyes.cache import ResultCache
+from twoeyes.batch import render_pairs
+from conftest import make_pair
+
+def test_hit(pair, tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    first = Stereo(*pair, cache=cache).to_anaglyph(directory=str(tmp_path))
+    assert cache.size() > 0
+
+    # a new Stereo of the same files shouldn't decode or encode anything
+    tracer = Tracer()
+    s = Stereo(*pair, cache=cache, tracer=tracer)
+    cached = s.to_anaglyph(directory=str(tmp_path))
+    assert cached != first and os.path.dirname(cached) == str(tmp_path)
+    with open(first, 'rb') as f:
+        assert open(cached, 'rb').read() == f.read()
+    stages = [r['stage'] for r in tracer.records]
+    assert ('decode' not in stages) and ('encode' not in stages)
+    assert [r['hit'] for r in tracer.records if r['stage'] == 'cache'] == [True]
+    assert s.to_anaglyph(sink='bytes') == open(first, 'rb').read()
+
+    # the copy stays, even if the cache throws out its own
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.size() == 0
+    assert open(cached, 'rb').read() == open(first, 'rb').read()
+    cache.max_bytes = 1024**3
+
+    # changing the settings (or the pixels) should miss
+    s.rotation = 90
+    assert s.to_anaglyph(sink='bytes') != open(first, 'rb').read()
+    s.rotation = 0
+    s.adjust(shift=(3, 0))
+    assert s.to_anaglyph(sink='bytes') != open(first, 'rb').read()
+
+def test_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for i in range(5):
+        cache.put(cache.key([str(i)]), 'bin', bytes(1000))
+        os.utime(cache.path(cache.key([str(i)]), 'bin'), (i, i))
+    cache.max_bytes = 2500
+    cache.get(cache.key(['0']), 'bin')
+    cache.put(cache.key(['5']), 'bin', bytes(1000))
+    assert cache.size() <= 2500
+    kept = [i for i in range(6) if cache.get(cache.key([str(i)]), 'bin') is not None]
+    assert kept == [0, 5]
+
+def put_many(directory, worker):
+    cache = ResultCache(directory, max_bytes=20000)
+    for i in range(50):
+        cache.put(cache.key([str(worker), str(i)]), 'bin', bytes(1000))
+    return True
+
+def test_shared(tmp_path):
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        assert all(executor.map(put_many, [str(tmp_path)]*4, range(4)))
+    cache = ResultCache(str(tmp_path))
+    assert cache.size() <= 20000
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(str(tmp_path)) for name in names)
+
+def test_batch(tmp_path):
+    make_pair(str(tmp_path), name='a')
+    pairs = [dict(name='a', left=str(tmp_path / 'a-left.jpg'), right=str(tmp_path / 'a-right.jpg'))]
+    cache = str(tmp_path / 'cache')
+    first = render_pairs(pairs, outputs=['anaglyph', 'gif'], directory=str(tmp_path / 'out'), processes=1, cache=cache)
+    second = render_pairs(pairs, outputs=['anaglyph', 'gif'], directory=str(tmp_path / 'out'), processes=1, cache=cache)
+    assert not any(f.startswith(cache) for f in second[0]['outputs'].values())
+    assert all(os.path.dirname(f) == str(tmp_path / 'out') for f in second[0]['outputs'].values())
+    assert len(os.listdir(str(tmp_path / 'out'))) == 4
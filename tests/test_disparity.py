@@ -0,0 +1,40 @@
+import numpy as np
+from PIL import Image
+from twoeyes import Stereo
+from twoeyes.disparity import estimate_disparity, box_sum
+
+def make_scene(shape=(300, 400), shifts=(7, 12)):
+    '''
+    Make a pair where the left half of the scene is shifted by
+    one disparity, and the right half by another.
+    '''
+    rng = np.random.default_rng(1)
+    rows, columns = shape
+    coarse = rng.integers(0, 256, (rows//4 + 2, columns//4 + 60)).astype(np.uint8)
+    big = np.asarray(Image.fromarray(coarse).resize((columns + 240, rows), Image.BILINEAR))
+    left = big[:, 100:100 + columns]
+    right = big[:, 100 - shifts[0]:100 - shifts[0] + columns].copy()
+    half = columns//2
+    right[:, half:] = big[:, 100 - shifts[1] + half:100 - shifts[1] + columns]
+    return left, right
+
+def test_box_sum():
+    a = np.arange(30, dtype=np.float32).reshape(5, 6)
+    padded = np.pad(a, 1, mode='edge')
+    expected = sum(padded[i:i + 5, j:j + 6] for i in range(3) for j in range(3))
+    assert np.allclose(box_sum(a, 1), expected)
+
+def test_disparity():
+    left, right = make_scene()
+    disparity = estimate_disparity(left, right, max_disparity=30, smallest=128)
+    assert disparity.shape == left.shape
+    assert abs(np.median(disparity[:, 20:180]) - 7) < 0.25
+    assert abs(np.median(disparity[:, 220:380]) - 12) < 0.25
+
+def test_to_disparity():
+    left, right = make_scene()
+    s = Stereo(left, right)
+    assert abs(np.median(s.disparity(max_disparity=30)) - 9.5) < 3
+    image = s.to_disparity(sink='array', max_disparity=30)
+    assert image.dtype == np.uint8
+    assert image[:, 220:380].mean() > image[:, 20:180].mean()
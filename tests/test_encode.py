@@ -0,0 +1,46 @@
+import io, pytest
+from PIL import Image
+from twoeyes import Stereo, encoder_presets, available_presets
+from twoeyes.cache import ResultCache
+
+def test_presets(pair):
+    s = Stereo(*pair)
+    sizes = {preset: len(s.to_anaglyph(sink='bytes', preset=preset)) for preset in ['fast', 'small', 'quality']}
+    assert sizes['small'] < sizes['quality']
+    assert Image.open(io.BytesIO(s.to_anaglyph(sink='bytes', preset='small'))).format == 'JPEG'
+
+    # the presets with formats of their own change the file extension
+    for preset in ['webp', 'avif']:
+        if preset in available_presets():
+            encoded = s.to_sidebyside(sink='bytes', preset=preset)
+            assert Image.open(io.BytesIO(encoded)).format == preset.upper()
+
+    # but the MPO is always an MPO
+    assert Image.open(io.BytesIO(s.to_mpo(sink='bytes', preset='webp'))).format == 'MPO'
+
+def test_overrides(pair, tmp_path):
+    s = Stereo(*pair)
+    assert len(s.to_anaglyph(sink='bytes', quality=20)) < len(s.to_anaglyph(sink='bytes'))
+    assert (len(s.to_anaglyph(sink='bytes', preset='quality', quality=20))
+            < len(s.to_anaglyph(sink='bytes', preset='quality')))
+    assert len(s.to_mpo(sink='bytes', preset='quality', quality=20)) < len(s.to_mpo(sink='bytes', preset='quality'))
+
+    # a filename's extension still wins over the preset's
+    filename = s.to_anaglyph(sink=str(tmp_path / 'anaglyph.png'), preset='webp')
+    assert Image.open(filename).format == 'PNG'
+
+    # and every output can take a preset at once
+    results = s.to_all(['anaglyph', 'sidebyside', 'gif'], sink='bytes', preset='fast')
+    assert all(len(encoded) > 0 for encoded in results.values())
+
+def test_presets_cached(pair, tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    s = Stereo(*pair, cache=cache)
+    assert s.to_anaglyph(sink='bytes', preset='small') != s.to_anaglyph(sink='bytes', preset='quality')
+    assert s.to_anaglyph(sink='bytes', quality=20) != s.to_anaglyph(sink='bytes', quality=90)
+
+def test_unknown_preset(pair):
+    s = Stereo(*pair)
+    with pytest.raises(ValueError):
+        s.to_anaglyph(sink='bytes', preset='tiny')
+    assert set(available_presets()) <= set(encoder_presets)
@@ -0,0 +1,40 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from twoeyes.stereo import create_safe_filename
+
+def claim(base, n=25):
+    return [create_safe_filename(base) for i in range(n)]
+
+def test_crowded_directory(tmp_path):
+    base = str(tmp_path / 'image.jpg')
+    for i in [0, 1, 2, 1234]:
+        (tmp_path / f'image-{i:03.0f}.jpg').write_bytes(b'')
+    (tmp_path / 'other-9999.jpg').write_bytes(b'')
+    assert create_safe_filename(base) == str(tmp_path / 'image-1235.jpg')
+    assert create_safe_filename(base) == str(tmp_path / 'image-1236.jpg')
+
+def test_concurrent_writers(tmp_path):
+    base = str(tmp_path / 'image.jpg')
+    with ProcessPoolExecutor(4) as processes, ThreadPoolExecutor(4) as threads:
+        futures = [processes.submit(claim, base) for i in range(4)]
+        futures += [threads.submit(claim, base) for i in range(4)]
+        claimed = [f for future in futures for f in future.result()]
+    assert len(set(claimed)) == len(claimed) == 200
+    assert len(os.listdir(tmp_path)) == 200
+
+def test_new_base_filename(tmp_path, monkeypatch):
+    # a base filename that's never been used shouldn't need a scan
+    import twoeyes.stereo
+    for i in range(100):
+        (tmp_path / f'other{i}-000.jpg').write_bytes(b'')
+    def scan(filename):
+        raise AssertionError('scanned the directory')
+    monkeypatch.setattr(twoeyes.stereo, 'find_highest_number', scan)
+    assert create_safe_filename(str(tmp_path / 'image.jpg')) == str(tmp_path / 'image-000.jpg')
+    assert create_safe_filename(str(tmp_path / 'image.jpg')) == str(tmp_path / 'image-001.jpg')
+
+    # and only so many base filenames are remembered
+    monkeypatch.setattr(twoeyes.stereo, 'max_filename_counters', 10)
+    for i in range(20):
+        create_safe_filename(str(tmp_path / f'many{i}.jpg'))
+    assert len(twoeyes.stereo.filename_counters) == 10
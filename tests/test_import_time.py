@@ -0,0 +1,32 @@
+import subprocess, sys
+
+# modules that `import twoeyes` should never pull in by itself
+heavy = ['matplotlib', 'ipywidgets', 'IPython', 'pillow_heif', 'pkg_resources']
+
+# the most time (in seconds) `import twoeyes` may take, on top of numpy and PIL
+budget = 0.25
+
+def import_time(statement):
+    '''
+    Measure the cumulative import time (in seconds) of each module
+    imported by a statement, in a fresh python process.
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and ('cumulative' not in line):
+            self, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative)/1e6
+    return times, result.stdout
+
+def test_import_time():
+    check = f'import twoeyes, sys; print([m for m in {heavy} if m in sys.modules])'
+    times, loaded = import_time(check)
+    assert loaded.strip() == '[]'
+    dependencies = times.get('numpy', 0) + times.get('PIL.Image', 0)
+    assert times['twoeyes'] - dependencies < budget
+
+def test_lazy_interface():
+    times, loaded = import_time('from twoeyes import MakeYourOwn; import sys; print("ipywidgets" in sys.modules)')
+    assert loaded.strip() == 'True'
@@ -0,0 +1,43 @@
+import threading
+from twoeyes import Stereo
+from twoeyes.instrument import Tracer, NullTracer, print_stage
+
+def test_tracer(pair, tmp_path, capsys):
+    records = []
+    tracer = Tracer(callbacks=[records.append, print_stage], memory=True)
+    s = Stereo(*pair, tracer=tracer)
+    filename = s.to_anaglyph(directory=str(tmp_path))
+
+    stages = [r['stage'] for r in records]
+    assert stages == ['open', 'open', 'decode', 'convert', 'decode', 'convert', 'compose', 'encode', 'write']
+    assert all(r['seconds'] >= 0 for r in records)
+    assert all(r['peak_bytes'] >= 0 for r in records)
+    decode = [r for r in records if r['stage'] == 'decode'][0]
+    assert decode['bytes_read'] > 0 and decode['depth'] == 1
+    write = records[-1]
+    assert write['filename'] == filename and write['bytes_written'] > 0
+    assert tracer.totals()['decode']['count'] == 2
+
+    # console output only comes from the tracer callback, not from Stereo itself
+    printed = capsys.readouterr().out
+    assert '[decode]' in printed and 'Saved' not in printed
+
+def test_to_all_shares_products(pair, tmp_path):
+    # both eyes should be decoded (and converted) up front, before the pool
+    # of threads starts, so no worker has to wait for another to decode them
+    records = []
+    def note(record):
+        records.append((record['stage'], record.get('eye'), threading.current_thread() is threading.main_thread()))
+    s = Stereo(*pair, tracer=Tracer(callbacks=[note]))
+    s.to_all(['anaglyph', 'sidebyside'], directory=str(tmp_path))
+    shared = [(stage, eye, main) for stage, eye, main in records if stage in ['decode', 'convert']]
+    assert sorted((stage, eye) for stage, eye, main in shared) == [('convert', 'left'), ('convert', 'right'),
+                                                                   ('decode', 'left'), ('decode', 'right')]
+    assert all(main for stage, eye, main in shared)
+    first_compose = [r[0] for r in records].index('compose')
+    assert all(records.index(r) < first_compose for r in shared)
+
+def test_null_tracer(pair):
+    s = Stereo(*pair)
+    assert isinstance(s.tracer, NullTracer)
+    assert len(s.to_anaglyph(sink='bytes')) > 0
@@ -0,0 +1,30 @@
+import os
+import numpy as np
+from PIL import Image
+from twoeyes import Stereo
+from twoeyes.pyramid import make_levels, tile_boxes
+from conftest import make_pair
+
+def test_levels():
+    levels = make_levels(Image.new('RGB', (1001, 333)))
+    assert [l.size for l in levels[:3]] == [(1001, 333), (501, 167), (251, 84)]
+    assert levels[-1].size == (1, 1) and len(levels) == 11
+    boxes = tile_boxes((600, 300), tile_size=254, overlap=1)
+    assert len(boxes) == 6
+    assert boxes[-1] == (2, 1, (507, 253, 600, 300))
+
+def test_to_pyramid(tmp_path):
+    pair = make_pair(str(tmp_path), shape=(300, 1000))
+    s = Stereo(*pair)
+    pyramid = s.to_pyramid('anaglyph', directory=str(tmp_path / 'out'), tiles=True, smallest=200,
+                          tile_size=254, extension='png')
+    assert [l[:2] for l in pyramid['levels']] == [(1000, 300), (500, 150), (250, 75)]
+    assert (np.asarray(Image.open(pyramid['levels'][0][2])) == s.to_anaglyph(sink='array')).all()
+    for width, height, filename in pyramid['levels']:
+        assert Image.open(filename).size == (width, height)
+
+    # deep zoom numbers levels up from 1 pixel, so the full resolution is level 10
+    files = pyramid['dzi'].replace('.dzi', '_files')
+    assert sorted(os.listdir(files), key=int) == [str(i) for i in range(11)]
+    assert Image.open(os.path.join(files, '10', '3_1.png')).size == (1000 - 761, 300 - 253)
+    assert pyramid['tiles'] == sum(len(os.listdir(os.path.join(files, d))) for d in os.listdir(files))
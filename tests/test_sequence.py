@@ -0,0 +1,40 @@
+import io, os, pytest
+import numpy as np
+from PIL import Image
+from twoeyes.sequence import list_frames, compose_frames, stream_frames
+from twoeyes.compose import anaglyph
+
+def make_frames(n, shape=(24, 32), seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, shape + (3,), dtype=np.uint8) for i in range(n)]
+
+def test_directories(tmp_path):
+    left, right = make_frames(12, seed=1), make_frames(12, seed=2)
+    for eye, frames in [('left', left), ('right', right)]:
+        (tmp_path / eye).mkdir()
+        for i, frame in enumerate(frames):
+            Image.fromarray(frame).save(str(tmp_path / eye / f'frame-{i}.png'))
+    assert os.path.basename(list_frames(str(tmp_path / 'left'))[2]) == 'frame-2.png'
+
+    filenames = stream_frames(str(tmp_path / 'left'), str(tmp_path / 'right'),
+                              directory=str(tmp_path / 'out'), extension='png', workers=3)
+    assert len(filenames) == 12
+    for filename, l, r in zip(filenames, left, right):
+        assert (np.array(Image.open(filename)) == anaglyph(l, r)).all()
+
+def test_generators(tmp_path):
+    left, right = make_frames(7, seed=1), make_frames(7, seed=2)
+    combined = list(compose_frames((x for x in left), (x for x in right), kind='sidebyside', workers=2))
+    assert [c.shape for c in combined] == [(24, 64, 3)]*7
+    assert all((c[:, 32:] == r).all() for c, r in zip(combined, right))
+
+    # frames can be streamed to a file-like sink, in order
+    buffer = io.BytesIO()
+    assert stream_frames(iter(left), iter(right), sink=buffer, extension='ppm') == 7
+    buffer.seek(0)
+    first = Image.open(buffer)
+    assert (np.array(first) == anaglyph(left[0], right[0])).all()
+
+def test_mismatched():
+    with pytest.raises(ValueError):
+        list(compose_frames(make_frames(3), make_frames(4)))
@@ -0,0 +1,67 @@
+import io, os, json, signal, socket, threading, urllib.request, urllib.error, uuid
+import numpy as np
+from PIL import Image
+from twoeyes import Stereo
+from twoeyes.server import make_server
+
+def post(url, files):
+    '''
+    Post files as a multipart form.
+    '''
+    boundary = uuid.uuid4().hex
+    body = b''
+    for name, content in files.items():
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{name}.jpg"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + b'\r\n'
+    body += f'--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def test_server(pair):
+    files = {}
+    for eye, filename in zip(['left', 'right'], pair):
+        with open(filename, 'rb') as f:
+            files[eye] = f.read()
+
+    server = make_server(port=0, workers=1, max_pending=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        status, headers, body = post(f'{url}/render?output=anaglyph', files)
+        assert (status, headers['Content-Type']) == (200, 'image/jpeg')
+        assert (np.asarray(Image.open(io.BytesIO(body))) == np.asarray(Image.open(io.BytesIO(Stereo(*pair).to_anaglyph(sink='bytes'))))).all()
+
+        status, headers, body = post(f'{url}/render?output=gif&rotation=90', files)
+        assert (status, Image.open(io.BytesIO(body)).size) == (200, (120, 160))
+
+        assert post(f'{url}/render?output=nope', files)[0] == 400
+        with urllib.request.urlopen(f'{url}/health') as response:
+            assert json.loads(response.read())['pending'] == 0
+        assert post(f'{url}/render', dict(left=b'not an image', right=b'nope'))[0] == 422
+
+        # a worker dying is the server's problem (not the upload's), and the pool recovers
+        for pid in list(server.executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert post(f'{url}/render', files)[0] == 503
+        assert post(f'{url}/render', files)[0] == 200
+
+        # a full queue turns requests away right away
+        server.max_pending = 0
+        status, headers, body = post(f'{url}/render', files)
+        assert (status, headers['Retry-After']) == (503, '1')
+
+        # (without waiting for the upload, which is never read)
+        with socket.create_connection(('127.0.0.1', server.server_address[1]), timeout=5) as connection:
+            connection.sendall(b'POST /render HTTP/1.1\r\nHost: x\r\nContent-Length: 1000000\r\n\r\n')
+            assert connection.recv(1024).startswith(b'HTTP/1.1 503')
+        with urllib.request.urlopen(f'{url}/health') as response:
+            assert json.loads(response.read())['pending'] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
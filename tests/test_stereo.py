@@ -1,5 +1,7 @@
 from twoeyes import Stereo
 from twoeyes.imports import data_directory, os
+import numpy as np, io, pytest
+from PIL import Image
 
 example_directory = 'two-eyes-examples'
 try:
@@ -13,3 +15,173 @@ def test_stereo():
     s.to_sidebyside(directory=example_directory)
     s.to_anaglyph(directory=example_directory)
     s.to_gif(directory=example_directory)
+
+def test_anaglyph_channels(pair, tmp_path):
+    s = Stereo(*pair)
+    filename = s.to_anaglyph(directory=str(tmp_path))
+    left = np.array(s.images['left'].convert('L'))
+    right = np.array(s.images['right'].convert('L'))
+    expected = np.zeros(left.shape + (3,), dtype=np.uint8)
+    expected[:,:,0], expected[:,:,1], expected[:,:,2] = left, right, right
+    reference = str(tmp_path / 'reference.jpg')
+    Image.fromarray(expected).save(reference)
+    assert open(filename, 'rb').read() == open(reference, 'rb').read()
+
+def test_sinks(pair, tmp_path):
+    s = Stereo(*pair)
+    encoded = s.to_anaglyph(sink='bytes')
+    assert Image.open(io.BytesIO(encoded)).format == 'JPEG'
+    buffer = io.BytesIO()
+    assert s.to_gif(sink=buffer) is buffer
+    assert Image.open(buffer).n_frames == 2
+    assert isinstance(s.to_anaglyph(sink='image'), Image.Image)
+    assert s.to_sidebyside(sink='array').shape == (120, 320, 3)
+    assert s.to_gif(sink='array').shape == (2, 120, 160, 3)
+    filename = str(tmp_path / 'chosen.png')
+    assert s.to_sidebyside(sink=filename) == filename
+    assert Image.open(filename).format == 'PNG'
+
+def test_derived_products(pair):
+    s = Stereo(*pair)
+    gray = s.derive('left', 'gray')
+    assert s.derive('left', 'gray') is gray
+    assert s.derive('left', 'gray-array').shape == (120, 160)
+
+    # right angles are lossless transposes, matching Image.rotate
+    s.rotation = 90
+    rotated = s.derive('left', 'gray')
+    assert rotated.size == (120, 160)
+    assert rotated.tobytes() == s.images['left'].convert('L').rotate(90, expand=True).tobytes()
+    assert s.derive('left', 'gray', 0) is gray
+    assert s.to_anaglyph(sink='array').shape == (160, 120, 3)
+
+    # replacing an image forgets what was derived from it
+    right = s.derive('right', 'gray')
+    s.images['left'] = s.images['right']
+    assert s.derive('left', 'gray') is not rotated
+    assert s.derive('right', 'gray') is right
+    s.images = dict(left=s.images['right'], right=s.images['left'])
+    assert s.derive('right', 'gray') is not right
+
+def test_animations(pair):
+    s = Stereo(*pair)
+    for format, expected in [('gif', 'GIF'), ('webp', 'WEBP'), ('apng', 'PNG')]:
+        encoded = s.to_animation(sink='bytes', format=format, width=80)
+        animation = Image.open(io.BytesIO(encoded))
+        assert animation.format == expected
+        assert animation.n_frames == 2
+        assert animation.size == (80, 60)
+
+    # both gif frames share one palette
+    frames = s.to_animation(sink='image', format='gif')
+    assert frames[0].getpalette() == frames[1].getpalette()
+
+def test_to_all(pair, tmp_path):
+    s = Stereo(*pair)
+    results = s.to_all(directory=str(tmp_path))
+    assert sorted(results) == ['anaglyph', 'gif', 'sidebyside']
+    assert all(os.path.exists(f) for f in results.values())
+    encoded = s.to_all(['anaglyph', 'gif'], sink=dict(anaglyph='bytes', gif='image'))
+    assert encoded['anaglyph'] == s.to_anaglyph(sink='bytes')
+    assert len(encoded['gif']) == 2
+
+def test_array_inputs(pair, tmp_path):
+    files = Stereo(*pair)
+    left, right = [np.array(Image.open(f)) for f in pair]
+
+    # arrays (and memmaps) are used without copying
+    np.save(str(tmp_path / 'right.npy'), right)
+    s = Stereo(left, str(tmp_path / 'right.npy'))
+    assert isinstance(s.images['right'], np.memmap)
+    assert np.shares_memory(s.derive('left', 'array'), left)
+    assert (s.to_anaglyph(sink='array') == files.to_anaglyph(sink='array')).all()
+    assert (s.to_sidebyside(sink='array') == files.to_sidebyside(sink='array')).all()
+
+    # right-angle rotations are views too
+    s.rotation = files.rotation = 90
+    assert np.shares_memory(s.derive('left', 'array'), left)
+    assert (s.to_anaglyph(sink='array') == files.to_anaglyph(sink='array')).all()
+
+    # cropping makes views
+    s.rotation = 0
+    s.adjust(shift=(4, -2))
+    assert s.images['left'].shape == (118, 156, 3)
+    assert np.shares_memory(s.images['left'], left)
+    assert len(s.to_all(['anaglyph', 'gif'], sink='bytes')) == 2
+
+    # an array can't hold both eyes
+    with pytest.raises(ValueError, match='right image'):
+        Stereo(left)
+
+def test_layouts(pair):
+    s = Stereo(*pair)
+    left, right = [np.asarray(s.images[eye]) for eye in ['left', 'right']]
+    arrays = Stereo(left, right)
+    for stereo in [s, arrays]:
+        assert (stereo.to_sidebyside(sink='array') == np.hstack([left, right])).all()
+        assert (stereo.to_crosseyed(sink='array') == np.hstack([right, left])).all()
+        assert (stereo.to_overunder(sink='array') == np.vstack([left, right])).all()
+        gapped = stereo.to_sidebyside(sink='array', gap=10, background=255)
+        assert gapped.shape == (120, 330, 3)
+        assert (gapped[:, 160:170] == 255).all() and (gapped[:, 170:] == right).all()
+
+def test_mpo(pair, tmp_path):
+    s = Stereo(*pair)
+    filename = s.to_mpo(directory=str(tmp_path))
+    assert os.path.basename(filename).startswith('stereograph-stereo') and filename.endswith('.mpo')
+    mpo = Image.open(filename)
+    assert (mpo.format, mpo.n_frames) == ('MPO', 2)
+    assert s.to_mpo(sink='array').shape == (2, 120, 160, 3)
+
+    # an MPO stays an MPO (even as a .jpg), and other formats are refused
+    assert Image.open(s.to_mpo(sink=str(tmp_path / 'pair.jpg'))).format == 'MPO'
+    with pytest.raises(ValueError):
+        s.to_mpo(sink=str(tmp_path / 'pair.png'))
+    with pytest.raises(ValueError, match='frames'):
+        s.to_gif(sink=str(tmp_path / 'wiggle.jpg'))
+
+def test_single_file(pair, tmp_path):
+    images = [Image.open(f) for f in pair]
+    filename = str(tmp_path / 'pair.mpo')
+    images[0].save(filename, save_all=True, append_images=[images[1]])
+
+    # frames aren't decoded until an output needs them
+    s = Stereo(filename)
+    assert all(s.images[eye].tile for eye in ['left', 'right'])
+    assert s.derive('left', 'digest') != s.derive('right', 'digest')
+    sidebyside = s.to_sidebyside(sink='array')
+    assert sidebyside.shape == (120, 320, 3)
+    with open(filename, 'rb') as f:
+        from_bytes = Stereo(f)
+    assert (from_bytes.to_sidebyside(sink='array') == sidebyside).all()
+    mpo = Image.open(filename)
+    mpo.seek(1)
+    assert (sidebyside[:, 160:] == np.asarray(mpo)).all()
+
+    # a single frame isn't enough
+    with pytest.raises(ValueError):
+        Stereo(pair[0])
+
+def test_sweep(pair, tmp_path):
+    s = Stereo(*pair)
+    shifts = [-6, 0, 5]
+    arrays = s.sweep(shifts, sink='array')
+    for shift in shifts:
+        adjusted = Stereo(*pair)
+        adjusted.adjust(shift=(shift, 0))
+        assert (arrays[shift] == adjusted.to_anaglyph(sink='array')).all()
+    assert s.sweep([3], output='crosseyed', sink='array')[3].shape == (120, 314, 3)
+
+    filenames = s.sweep(shifts, directory=str(tmp_path))
+    assert all(os.path.basename(filenames[x]).startswith(f'stereograph-red-cyan-shift{x:+d}') for x in shifts)
+    sheet = s.to_contact_sheet(list(range(-8, 9, 2)), width=40, sink='image')
+    assert sheet.size == (3*40, 3*30)
+
+def test_images_set_later(pair):
+    s = Stereo()
+    assert s.images['left'] is None
+    thumbnails = [Image.open(f).reduce(4) for f in pair]
+    s.images.update(left=thumbnails[0], right=thumbnails[1])
+    s.rotation = 90
+    assert s.to_anaglyph(sink='image').size == (30, 40)
+    assert ('left', 'gray', 0) in s.derived_products
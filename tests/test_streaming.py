@@ -0,0 +1,24 @@
+import numpy as np
+from PIL import Image
+from twoeyes import Stereo
+from twoeyes.streaming import stream_sidebyside, stream_anaglyph, open_raster
+
+def test_streaming_matches_stereo(pair, tmp_path):
+    # save the pair as memory-mappable PPM files
+    ppm = {}
+    for eye, filename in zip(['left', 'right'], pair):
+        ppm[eye] = str(tmp_path / f'{eye}.ppm')
+        Image.open(filename).save(ppm[eye])
+    s = Stereo(ppm['left'], ppm['right'])
+    assert isinstance(open_raster(ppm['left']), np.memmap)
+
+    # a tiny budget forces lots of strips
+    budget = 5000
+    output = stream_anaglyph(ppm['left'], ppm['right'], str(tmp_path / 'anaglyph.ppm'), memory_budget=budget)
+    left, right = s.images['left'].convert('L'), s.images['right'].convert('L')
+    expected = np.array(Image.merge('RGB', (left, right, right)))
+    assert (np.array(Image.open(output)) == expected).all()
+
+    output = stream_sidebyside(ppm['left'], ppm['right'], str(tmp_path / 'sidebyside.npy'), memory_budget=budget)
+    expected = np.hstack([np.array(s.images['left']), np.array(s.images['right'])])
+    assert (np.load(output) == expected).all()
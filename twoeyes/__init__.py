@@ -1,2 +1,18 @@
 from .stereo import *
-from .interface import *
+from .batch import *
+from .streaming import *
+from .sequence import *
+from .instrument import *
+from .cache import *
+from .encode import *
+
+def __getattr__(name):
+    '''
+    Import the notebook interface only when it's asked for,
+    because ipywidgets and IPython are slow to import (and
+    not needed at all for making stereographs in scripts).
+    '''
+    if name == 'MakeYourOwn':
+        from .interface import MakeYourOwn
+        return MakeYourOwn
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,109 @@
+'''
+Tools for lining up the two eyes automatically, by
+measuring how far one image is shifted from the other.
+'''
+from .imports import *
+from . import compose
+
+__all__ = ['estimate_offset']
+
+def to_grayscale(image):
+    '''
+    Get a grayscale PIL image from a PIL image or an array.
+    '''
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(compose.luminance(image))
+    if image.mode != 'L':
+        image = image.convert('L')
+    return image
+
+def make_pyramid(image, smallest=256):
+    '''
+    Make a list of images, each half the size of the one before,
+    until the largest dimension is no more than `smallest`.
+    '''
+    pyramid = [image]
+    while max(pyramid[-1].size) > smallest:
+        pyramid.append(pyramid[-1].reduce(2))
+    return pyramid
+
+def phase_correlate(left, right):
+    '''
+    Measure the shift between two same-sized arrays with FFT phase correlation.
+
+    Returns
+    -------
+    shift : array
+        The (rows, columns) by which features in `right`
+        are shifted relative to the same features in `left`.
+    '''
+    rows, columns = left.shape
+
+    # taper the edges, so they don't look like features
+    window = np.outer(np.hanning(rows), np.hanning(columns)).astype(np.float32)
+    a = np.fft.rfft2((left - left.mean())*window)
+    b = np.fft.rfft2((right - right.mean())*window)
+
+    # the normalized cross-power spectrum has a peak at the shift
+    cross = b*np.conj(a)
+    cross /= np.abs(cross) + 1e-12
+    correlation = np.fft.irfft2(cross, s=left.shape)
+    peak = np.array(np.unravel_index(np.argmax(correlation), correlation.shape))
+
+    # wrap shifts past the halfway point around to negative
+    size = np.array(correlation.shape)
+    peak[peak > size//2] -= size[peak > size//2]
+    return peak
+
+def estimate_offset(left, right, smallest=256, window=512):
+    '''
+    Estimate how far the right eye is shifted from the left eye.
+
+    The shift is first found roughly, using phase correlation on heavily
+    shrunk copies of the two images, and then refined at each finer
+    level of a pyramid, using phase correlation on a central window.
+
+    Parameters
+    ----------
+    left, right : PIL.Image, array
+        The two eyes, which must be the same size.
+    smallest : int
+        How big (in pixels) is the coarsest level of the pyramid?
+    window : int
+        How big (in pixels) is the window used at finer levels?
+
+    Returns
+    -------
+    shift : tuple
+        The (x, y) shift in pixels, where a feature at (x, y) in
+        the left image appears at (x + shift[0], y + shift[1]) in
+        the right image.
+    '''
+
+    # make pyramids for both eyes
+    left, right = to_grayscale(left), to_grayscale(right)
+    if left.size != right.size:
+        raise ValueError(f'The eyes have different sizes ({left.size} and {right.size}).')
+    pyramids = [make_pyramid(x, smallest=smallest) for x in [left, right]]
+
+    # get a rough shift from the coarsest level
+    coarsest = [np.asarray(x[-1], dtype=np.float32) for x in pyramids]
+    shift = phase_correlate(*coarsest)
+
+    # refine that shift at each finer level
+    for level in range(len(pyramids[0]) - 2, -1, -1):
+        shift *= 2
+        a, b = [np.asarray(x[level]) for x in pyramids]
+        rows, columns = a.shape
+        n = min(window, rows - abs(shift[0]), columns - abs(shift[1]))
+        if n < 16:
+            continue
+
+        # cut out the overlapping central window from each eye
+        y = max(0, shift[0]) + (rows - abs(shift[0]) - n)//2
+        x = max(0, shift[1]) + (columns - abs(shift[1]) - n)//2
+        a = a[y - shift[0]:y - shift[0] + n, x - shift[1]:x - shift[1] + n]
+        b = b[y:y + n, x:x + n]
+        shift += phase_correlate(a.astype(np.float32), b.astype(np.float32))
+
+    return int(shift[1]), int(shift[0])
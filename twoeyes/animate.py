@@ -0,0 +1,100 @@
+'''
+Tools for making animated stereographs, which flip back and
+forth between the two eyes ("wiggle" stereographs).
+
+GIF is the classic format, but it's slow to encode (and big) if
+every full-resolution frame gets its own palette. Here, both eyes
+are quantized once against a single palette that they share, and
+can be shrunk to a target width before encoding. Animated WebP
+and APNG are available as alternatives.
+'''
+from .imports import *
+
+__all__ = ['animation_formats', 'prepare_frames']
+
+# for each animated format, what file extension (and so PIL format)
+# does it use, and what keywords should be passed along to PIL?
+animation_formats = {'gif': dict(extension='gif', save=dict(optimize=False)),
+                     'webp': dict(extension='webp', save=dict(quality=80, method=4)),
+                     'apng': dict(extension='png', save=dict(optimize=False))}
+
+def resize_frames(frames, width=None):
+    '''
+    Shrink frames to a target width (if they're wider than it),
+    keeping their aspect ratios.
+    '''
+    if width is None:
+        return frames
+    resized = []
+    for frame in frames:
+        if frame.width > width:
+            height = max(1, round(frame.height*width/frame.width))
+            frame = frame.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        resized.append(frame)
+    return resized
+
+def make_shared_palette(frames, colors=256, sample=512):
+    '''
+    Make one palette that works for all frames, from small
+    copies of the frames stacked on top of each other.
+
+    Parameters
+    ----------
+    frames : list of PIL.Image
+        The frames that will share the palette.
+    colors : int
+        How many colors should the palette have (at most 256)?
+    sample : int
+        How big (in pixels) should the small copies be?
+
+    Returns
+    -------
+    palette : PIL.Image
+        A 'P' mode image, whose palette can be used with `.quantize(palette=...)`.
+    '''
+    samples = []
+    for frame in frames:
+        small = frame.convert('RGB')
+        small.thumbnail((sample, sample), Image.Resampling.NEAREST)
+        samples.append(small)
+    stacked = Image.new('RGB', (max(s.width for s in samples), sum(s.height for s in samples)))
+    y = 0
+    for s in samples:
+        stacked.paste(s, (0, y))
+        y += s.height
+    return stacked.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+
+def prepare_frames(frames, format='gif', width=None, colors=256, dither=False):
+    '''
+    Get frames ready to be encoded into an animation.
+
+    Parameters
+    ----------
+    frames : list of PIL.Image
+        The frames of the animation.
+    format : str
+        'gif', 'webp', or 'apng'
+    width : int
+        If not None, shrink the frames to this width (in pixels) first.
+    colors : int
+        For 'gif' (or 'apng'), quantize both frames to a shared palette with
+        this many colors. For 'apng', None keeps the frames in full color.
+    dither : bool
+        Should the quantized frames be dithered?
+
+    Returns
+    -------
+    frames : list of PIL.Image
+        The prepared frames.
+    '''
+    if format not in animation_formats:
+        raise ValueError(f"format must be one of {list(animation_formats)}, not '{format}'")
+    frames = resize_frames(frames, width=width)
+
+    # quantize once, against one palette for all frames
+    if (format == 'gif') or ((format == 'apng') and (colors is not None)):
+        palette = make_shared_palette(frames, colors=colors or 256)
+        dither = Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE
+        return [frame.convert('RGB').quantize(palette=palette, dither=dither) for frame in frames]
+
+    return [frame if frame.mode in ['RGB', 'RGBA'] else frame.convert('RGB') for frame in frames]
@@ -0,0 +1,288 @@
+'''
+Tools for making stereographs from many pairs of images at once,
+spreading the work out over a pool of processes.
+'''
+from .imports import *
+from .stereo import Stereo
+from .cache import ResultCache
+import csv, re, optparse, traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+__all__ = ['find_pairs', 'read_manifest', 'render_pair', 'render_pairs']
+
+# which Stereo method makes each kind of output?
+output_methods = Stereo.output_methods
+
+# how do we recognize left/right images in a directory?
+eye_pattern = re.compile(r'^(?P<name>.*?)[-_. ]?(?P<eye>left|right)$', re.IGNORECASE)
+
+def find_pairs(directory, verbose=False):
+    '''
+    Find pairs of images in a directory.
+
+    Images are paired up by name, so `cactus-left.jpg` will be
+    matched with `cactus-right.jpg` (or `cactus_right.png`). Images
+    that don't have a partner are ignored (with a warning, if `verbose`).
+
+    Parameters
+    ----------
+    directory : str
+        The directory to search for images.
+    verbose : bool
+        Should images without a partner be mentioned?
+
+    Returns
+    -------
+    pairs : list of dict
+        One dictionary (with 'name', 'left', 'right') per pair,
+        sorted by name.
+    '''
+
+    # sort the files in the directory into eyes
+    found = {}
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if not os.path.isfile(path):
+            continue
+        stem = os.path.splitext(filename)[0]
+        match = eye_pattern.match(stem)
+        if match is None:
+            continue
+        name = match.group('name') or 'stereograph'
+        eye = match.group('eye').lower()
+        found.setdefault(name, {})[eye] = path
+
+    # keep only the complete pairs
+    pairs = []
+    for name in sorted(found):
+        eyes = found[name]
+        if ('left' in eyes) and ('right' in eyes):
+            pairs.append(dict(name=name, left=eyes['left'], right=eyes['right']))
+        elif verbose:
+            missing = 'right' if 'left' in eyes else 'left'
+            print(f'  skipping {name}, which has no {missing} image')
+    return pairs
+
+def read_manifest(filename):
+    '''
+    Read pairs of images from a manifest file.
+
+    The manifest is a comma-separated text file with one pair per line,
+    as `left,right` or `left,right,name`. Blank lines and lines starting
+    with `#` are skipped, as is a header line of `left,right[,name]`.
+    Relative paths are relative to the directory of the manifest.
+
+    Parameters
+    ----------
+    filename : str
+        The manifest file to read.
+
+    Returns
+    -------
+    pairs : list of dict
+        One dictionary (with 'name', 'left', 'right') per pair,
+        in the order they appear in the manifest.
+    '''
+
+    directory = os.path.dirname(filename)
+    pairs = []
+    with open(filename, newline='') as f:
+        for row in csv.reader(f):
+            row = [x.strip() for x in row]
+            if (len(row) == 0) or (row[0] == '') or row[0].startswith('#'):
+                continue
+            if [x.lower() for x in row[:2]] == ['left', 'right']:
+                continue
+            if len(row) not in [2, 3]:
+                raise ValueError(f'{filename} has a line with {len(row)} entries: {row}')
+            left, right = [os.path.join(directory, x) for x in row[:2]]
+            if len(row) == 3:
+                name = row[2]
+            else:
+                name = eye_pattern.sub(r'\g<name>', os.path.splitext(os.path.basename(left))[0])
+            pairs.append(dict(name=name or f'stereograph-{len(pairs):05.0f}', left=left, right=right))
+    return pairs
+
+def render_pair(pair, outputs=['anaglyph'], directory='', cache=None):
+    '''
+    Make stereographs for one pair of images.
+
+    This never raises an exception because of a bad image;
+    instead, any errors are recorded in the result.
+
+    Parameters
+    ----------
+    pair : dict
+        A dictionary with 'name', 'left', 'right'.
+    outputs : list of str
+        Which outputs to make? Options are the keys of `Stereo.output_methods`
+        ('sidebyside', 'crosseyed', 'overunder', 'anaglyph', 'gif', 'mpo', 'disparity').
+    directory : str
+        The directory into which outputs should be saved.
+    cache : twoeyes.cache.ResultCache, str
+        A cache of finished outputs (see `Stereo`). Outputs found
+        in the cache are copied into `directory`, without being remade.
+
+    Returns
+    -------
+    result : dict
+        The pair, with 'outputs' (a dictionary of output filenames),
+        'error' (None if everything went well), and 'traceback'.
+    '''
+
+    result = dict(pair, outputs={}, error=None, traceback=None)
+    try:
+        s = Stereo(pair['left'], pair['right'], prefix=pair.get('name', 'stereograph'), cache=cache)
+        result['outputs'] = s.to_all(outputs, directory=directory)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        result['traceback'] = traceback.format_exc()
+    return result
+
+def render_alone(pair, outputs=['anaglyph'], directory='', cache=None):
+    '''
+    Make stereographs for one pair in a process of its own, so
+    that if it crashes the process, only this pair fails.
+    '''
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(render_pair, pair, outputs, directory, cache).result()
+        except BrokenProcessPool as e:
+            return dict(pair, outputs={}, error=f'{type(e).__name__}: {e}',
+                        traceback=traceback.format_exc())
+
+def render_pairs(pairs, outputs=['anaglyph'], directory='', processes=None, cache=None, verbose=False):
+    '''
+    Make stereographs for lots of pairs of images, in parallel.
+
+    Parameters
+    ----------
+    pairs : list of dict
+        Dictionaries with 'name', 'left', 'right' (for
+        example, from `find_pairs` or `read_manifest`).
+    outputs : list of str
+        Which outputs to make? Options are the keys of `Stereo.output_methods`
+        ('sidebyside', 'crosseyed', 'overunder', 'anaglyph', 'gif', 'mpo', 'disparity').
+    directory : str
+        The directory into which outputs should be saved.
+    processes : int
+        How many processes to use? None will use one per CPU,
+        and 1 will do everything in this process.
+    cache : twoeyes.cache.ResultCache, str
+        A cache of finished outputs, which can be shared by
+        all the processes (and by later runs).
+    verbose : bool
+        Should progress be printed as each pair finishes?
+
+    Returns
+    -------
+    results : list of dict
+        One result (see `render_pair`) per pair, in the same order as `pairs`.
+    '''
+
+    # complain about outputs we don't know how to make
+    for kind in outputs:
+        if kind not in output_methods:
+            raise ValueError(f"'{kind}' is not one of {list(output_methods)}")
+
+    # make sure there's somewhere to save outputs
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+
+    results = [None]*len(pairs)
+    def report(i, result):
+        results[i] = result
+        if not verbose:
+            return
+        done = sum(r is not None for r in results)
+        status = 'ok' if result['error'] is None else f"FAILED ({result['error']})"
+        print(f"[{done}/{len(pairs)}] {result.get('name')}: {status}")
+
+    # do everything here, or farm it out to a pool of processes
+    if processes == 1:
+        for i, pair in enumerate(pairs):
+            report(i, render_pair(pair, outputs, directory, cache))
+    else:
+        processes = processes or os.cpu_count() or 1
+        waiting = list(range(len(pairs)))[::-1]
+        while len(waiting) > 0:
+            # keep one pair per worker in flight, so if a pair crashes its
+            # worker (and breaks the pool), only those pairs are suspects
+            suspects = []
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                running = {}
+                while True:
+                    while (len(waiting) > 0) and (len(running) < processes):
+                        i = waiting.pop()
+                        running[executor.submit(render_pair, pairs[i], outputs, directory, cache)] = i
+                    if len(running) == 0:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = running.pop(future)
+                        try:
+                            report(i, future.result())
+                        except BrokenProcessPool:
+                            suspects.append(i)
+                    if len(suspects) > 0:
+                        suspects += list(running.values())
+                        break
+
+            # try each suspect on its own (so only the one that crashes
+            # fails), and then carry on with the rest in a fresh pool
+            for i in sorted(suspects):
+                report(i, render_alone(pairs[i], outputs, directory, cache))
+
+    return results
+
+def main(args=None):
+    '''
+    Make stereographs for lots of pairs from the command line.
+    (This is the `two-eyes-batch` script.)
+    '''
+
+    parser = optparse.OptionParser(usage = """
+    two-eyes-batch [options] directory_or_manifest
+
+Make stereographs for every pair of images in a directory
+(named like `something-left.jpg` and `something-right.jpg`)
+or listed in a comma-separated manifest (`left,right[,name]`).""")
+    parser.add_option('-o', '--outputs', dest='outputs', default='anaglyph',
+        help = f"comma-separated outputs to make, from {','.join(output_methods)} [default: %default]")
+    parser.add_option('-d', '--directory', dest='directory', default='',
+        help = 'directory into which outputs will be saved [default: current directory]')
+    parser.add_option('-p', '--processes', dest='processes', type='int', default=None,
+        help = 'number of processes to use [default: one per CPU]')
+    parser.add_option('-c', '--cache', dest='cache', default=None,
+        help = 'directory in which to cache outputs, so pairs are never made twice [default: no cache]')
+    parser.add_option('--cache-size', dest='cache_size', type='float', default=1024,
+        help = 'how big the cache can get, in MB [default: %default]')
+    options, args = parser.parse_args(args)
+
+    if len(args) != 1:
+        parser.error('Please provide one directory or manifest file.')
+    source = args[0]
+    if os.path.isdir(source):
+        pairs = find_pairs(source, verbose=True)
+    else:
+        pairs = read_manifest(source)
+
+    outputs = [x.strip() for x in options.outputs.split(',') if x.strip() != '']
+    cache = None
+    if options.cache is not None:
+        cache = ResultCache(options.cache, max_bytes=int(options.cache_size*1024**2))
+    results = render_pairs(pairs, outputs=outputs,
+                                  directory=options.directory,
+                                  processes=options.processes,
+                                  cache=cache,
+                                  verbose=True)
+
+    failed = [r for r in results if r['error'] is not None]
+    print(f'Made stereographs for {len(results) - len(failed)} of {len(results)} pairs.')
+    for r in failed:
+        print(f"  {r['name']} ({r['left']}, {r['right']}) failed with {r['error']}")
+    return 1 if len(failed) > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+'''
+A cache of finished stereographs on disk, so the same pair
+made with the same settings never has to be made twice.
+
+Each result is stored under a hash of the input images' bytes
+and every setting that affects the output, so a hit can be
+handed back without decoding or encoding anything. The cache is
+kept under a size limit by throwing out the least recently used
+results. Several processes can share one cache directory: results
+are written atomically, and eviction is done under a file lock.
+'''
+from .imports import *
+import hashlib, json, tempfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__all__ = ['ResultCache']
+
+def hash_file(filename, chunk=1024**2):
+    '''
+    Hash the bytes of a file (without holding it all in memory).
+    '''
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def hash_bytes(data):
+    '''
+    Hash some bytes (or anything that supports the buffer protocol).
+    '''
+    return hashlib.sha256(data).hexdigest()
+
+class ResultCache:
+    '''
+    A content-addressed, size-limited cache of stereographs on disk.
+    '''
+    def __init__(self, directory, max_bytes=1024**3):
+        '''
+        Parameters
+        ----------
+        directory : str
+            The directory in which to keep the cache (which
+            can be shared by several processes at once).
+        max_bytes : int
+            Roughly how big is the cache allowed to get (in bytes)?
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # keep a running estimate of the size, so we don't
+        # have to look at every file every time we add one
+        self.estimated_bytes = None
+
+    def key(self, digests, **settings):
+        '''
+        Make a key from the hashes of the inputs and the settings.
+
+        Parameters
+        ----------
+        digests : list of str
+            Hashes of the bytes of each input image.
+        **settings
+            Everything else that affects the output (the kind of
+            output, rotation, encoder parameters, ...), which must
+            be representable as JSON.
+        '''
+        description = json.dumps(dict(digests=list(digests), **settings), sort_keys=True, default=repr)
+        return hash_bytes(description.encode())
+
+    def path(self, key, extension):
+        '''
+        Where would the result for a key be kept?
+        '''
+        return os.path.join(self.directory, key[:2], f'{key}.{extension}')
+
+    def get(self, key, extension):
+        '''
+        Look for a result in the cache.
+
+        Returns
+        -------
+        path : str
+            The file containing the result (or None, if it isn't in the cache).
+            (If the cache is shared, another process may evict the file at any
+            time, so be ready for it to disappear before it can be read.)
+        '''
+        path = self.path(key, extension)
+        try:
+            # mark it as recently used
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            return None
+
+    def read(self, key, extension):
+        '''
+        Read a result from the cache, as bytes (or None, if it isn't there).
+        '''
+        path = self.get(key, extension)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except (TypeError, FileNotFoundError):
+            return None
+
+    def put(self, key, extension, data):
+        '''
+        Add a result to the cache.
+
+        Parameters
+        ----------
+        key : str
+            The key for the result (see `key`).
+        extension : str
+            The file extension for the result.
+        data : bytes
+            The encoded result.
+
+        Returns
+        -------
+        path : str
+            The file containing the result.
+        '''
+        path = self.path(key, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temporary file, and then move it into place all at once,
+        # so nobody can ever see a half-written result
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        # make room, if we need to
+        if self.estimated_bytes is None:
+            self.estimated_bytes = self.size()
+        else:
+            self.estimated_bytes += len(data)
+        if self.estimated_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def entries(self):
+        '''
+        List everything in the cache, as (last used, bytes, path), oldest first.
+        '''
+        entries = []
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def size(self):
+        '''
+        How big is the cache (in bytes)?
+        '''
+        return sum(e[1] for e in self.entries())
+
+    def evict(self):
+        '''
+        Remove the least recently used results, until the cache fits within `max_bytes`.
+        '''
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = self.entries()
+            total = sum(e[1] for e in entries)
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.estimated_bytes = total
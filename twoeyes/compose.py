@@ -0,0 +1,157 @@
+'''
+Array-level building blocks for combining two eyes into one image.
+
+These work on (rows x columns) or (rows x columns x 3) uint8 arrays,
+which can be whole images or just a strip of rows from each eye,
+and they can write into an `out` array that already exists.
+'''
+from .imports import *
+
+__all__ = ['luminance', 'anaglyph', 'sidebyside', 'arrange', 'layout']
+
+def luminance(rgb, out=None):
+    '''
+    Convert an RGB array to grayscale, exactly as PIL's `.convert('L')` would.
+
+    Parameters
+    ----------
+    rgb : array
+        A (rows x columns x 3) uint8 array. A (rows x columns)
+        array is assumed to be grayscale already.
+    out : array
+        A (rows x columns) uint8 array into which to write the result.
+
+    Returns
+    -------
+    gray : array
+        A (rows x columns) uint8 array.
+    '''
+    if out is None:
+        out = np.empty(rgb.shape[:2], dtype=np.uint8)
+    if rgb.ndim == 2:
+        out[:] = rgb
+        return out
+
+    # L = (19595 R + 38470 G + 7471 B + 0x8000) >> 16, as in PIL's Convert.c
+    total = np.multiply(rgb[:,:,0], 19595, dtype=np.uint32)
+    total += np.multiply(rgb[:,:,1], 38470, dtype=np.uint32)
+    total += np.multiply(rgb[:,:,2], 7471, dtype=np.uint32)
+    total += 0x8000
+    total >>= 16
+    out[:] = total
+    return out
+
+def anaglyph(left, right, out=None):
+    '''
+    Combine two eyes into a red-cyan anaglyph.
+
+    Parameters
+    ----------
+    left, right : array
+        (rows x columns) grayscale or (rows x columns x 3) RGB arrays.
+    out : array
+        A (rows x columns x 3) uint8 array into which to write the result.
+
+    Returns
+    -------
+    combined : array
+        A (rows x columns x 3) uint8 array, with the left eye in
+        the red channel and the right eye in green and blue.
+    '''
+    if out is None:
+        out = np.empty(left.shape[:2] + (3,), dtype=np.uint8)
+    luminance(left, out=out[:,:,0])
+    luminance(right, out=out[:,:,1])
+    out[:,:,2] = out[:,:,1]
+    return out
+
+def sidebyside(left, right, out=None):
+    '''
+    Combine two eyes into one wide image, with left on the left.
+
+    Parameters
+    ----------
+    left, right : array
+        (rows x columns) or (rows x columns x 3) arrays, of the same shape.
+    out : array
+        A (rows x 2*columns [x 3]) array into which to write the result.
+
+    Returns
+    -------
+    combined : array
+        The two eyes next to each other.
+    '''
+    rows, columns = left.shape[:2]
+    if out is None:
+        out = np.empty((rows, 2*columns) + left.shape[2:], dtype=left.dtype)
+    out[:, :columns] = left
+    out[:, columns:] = right
+    return out
+
+# how can the two eyes be laid out next to each other?
+layouts = ['sidebyside', 'crosseyed', 'overunder']
+
+def arrange(sizes, layout='sidebyside', gap=0):
+    '''
+    Figure out where each eye goes on a canvas.
+
+    Parameters
+    ----------
+    sizes : list of tuples
+        The (width, height) of the left and right eyes.
+    layout : str
+        'sidebyside' = left eye on the left (for parallel viewing)
+        'crosseyed' = left eye on the right (for cross-eyed viewing)
+        'overunder' = left eye on top
+    gap : int
+        How many pixels should be left between the eyes?
+
+    Returns
+    -------
+    size : tuple
+        The (width, height) of the whole canvas.
+    corners : list of tuples
+        The (x, y) of the upper left corner of the left and right eyes.
+    '''
+    (lw, lh), (rw, rh) = sizes
+    if layout == 'sidebyside':
+        return (lw + gap + rw, max(lh, rh)), [(0, 0), (lw + gap, 0)]
+    if layout == 'crosseyed':
+        return (rw + gap + lw, max(lh, rh)), [(rw + gap, 0), (0, 0)]
+    if layout == 'overunder':
+        return (max(lw, rw), lh + gap + rh), [(0, 0), (0, lh + gap)]
+    raise ValueError(f"layout must be one of {layouts}, not '{layout}'")
+
+def layout(left, right, layout='sidebyside', gap=0, background=0, out=None):
+    '''
+    Lay out two eyes on one canvas.
+
+    Parameters
+    ----------
+    left, right : array
+        (rows x columns) or (rows x columns x 3) arrays.
+    layout : str
+        'sidebyside', 'crosseyed', or 'overunder' (see `arrange`).
+    gap : int
+        How many pixels should be left between the eyes?
+    background : int
+        The value for any part of the canvas not covered by an eye.
+    out : array
+        An array of the right shape into which to write the result.
+
+    Returns
+    -------
+    combined : array
+        The two eyes on one canvas.
+    '''
+    sizes = [(x.shape[1], x.shape[0]) for x in [left, right]]
+    (width, height), corners = arrange(sizes, layout=layout, gap=gap)
+    if out is None:
+        out = np.empty((height, width) + left.shape[2:], dtype=left.dtype)
+
+    # only fill in the background if some of it will show
+    if sum(w*h for w, h in sizes) < width*height:
+        out[:] = background
+    for array, (x, y) in zip([left, right], corners):
+        out[y:y + array.shape[0], x:x + array.shape[1]] = array
+    return out
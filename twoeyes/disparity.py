@@ -0,0 +1,175 @@
+'''
+Tools for measuring disparity (how far each part of the scene
+shifts between the two eyes), which is a stand-in for depth.
+
+This uses block matching: for each pixel of the left eye, it looks
+for the horizontal shift at which a small block of the right eye
+best matches (with the smallest sum of absolute differences). To be
+fast on big images, it works coarse-to-fine: every possible shift is
+tried on a small copy of the pair, and then each larger copy only
+refines the shifts found at the scale below it. Each scale is split
+into bands of rows, which are matched at the same time on a pool of
+threads (numpy lets go of the GIL while it does the arithmetic).
+'''
+from .imports import *
+
+__all__ = ['estimate_disparity', 'disparity_to_image']
+
+def box_sum(cost, radius):
+    '''
+    Add up the values in a (2*radius + 1)-pixel square around every
+    pixel (repeating the values at the edges), using running sums.
+    '''
+    k = 2*radius + 1
+    padded = np.pad(cost, radius, mode='edge')
+    total = np.cumsum(padded, axis=1, dtype=np.float32)
+    total = total[:, k - 1:] - np.pad(total, ((0, 0), (1, 0)))[:, :-k]
+    total = np.cumsum(total, axis=0)
+    return total[k - 1:] - np.pad(total, ((1, 0), (0, 0)))[:-k]
+
+def halve(array):
+    '''
+    Shrink an array to half its size, by averaging 2x2 blocks.
+    '''
+    rows, columns = array.shape[0]//2, array.shape[1]//2
+    return array[:2*rows, :2*columns].reshape(rows, 2, columns, 2).mean(axis=(1, 3), dtype=np.float32)
+
+def upsample(disparity, shape):
+    '''
+    Stretch a disparity map to twice its size (and twice its shifts), to fit `shape`.
+    '''
+    rows = np.minimum(np.arange(shape[0])//2, disparity.shape[0] - 1)
+    columns = np.minimum(np.arange(shape[1])//2, disparity.shape[1] - 1)
+    return 2*disparity[rows][:, columns]
+
+def match_costs(left, right, disparity, radius):
+    '''
+    Measure how well blocks of the left eye match blocks of the right
+    eye shifted by `disparity` (one shift per pixel, in columns).
+    '''
+    columns = np.clip(np.arange(left.shape[1]) + disparity, 0, left.shape[1] - 1)
+    shifted = np.take_along_axis(right, columns, axis=1)
+    return box_sum(np.abs(left - shifted), radius)
+
+def match_band(left, right, prior, offsets, radius, subpixel=False):
+    '''
+    Find the best shift for every pixel in a band of rows, trying
+    each of the `offsets` from the `prior` guess at every pixel.
+    '''
+    best_cost = np.full(left.shape, np.inf, dtype=np.float32)
+    best = prior.copy()
+    for offset in offsets:
+        cost = match_costs(left, right, prior + offset, radius)
+        better = cost < best_cost
+        best_cost[better] = cost[better]
+        best[better] = prior[better] + offset
+    if not subpixel:
+        return best
+
+    # fit a parabola through the costs on either side of the best shift
+    before = match_costs(left, right, best - 1, radius)
+    after = match_costs(left, right, best + 1, radius)
+    curvature = before - 2*best_cost + after
+    nudge = np.where(curvature > 0, (before - after)/(2*np.maximum(curvature, 1e-6)), 0)
+    return best + np.clip(nudge, -0.5, 0.5).astype(np.float32)
+
+def match(left, right, prior, offsets, radius, subpixel=False, executor=None, band_rows=256):
+    '''
+    Match a whole image, split into bands of rows (each with enough
+    rows on either side that blocks near the band edges are right).
+    '''
+    rows = left.shape[0]
+    bands = max(1, int(np.ceil(rows/band_rows)))
+    edges = np.linspace(0, rows, bands + 1).astype(int)
+    jobs = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+        if stop <= start:
+            continue
+        low, high = max(0, start - radius), min(rows, stop + radius)
+        band = [x[low:high] for x in [left, right, prior]]
+        jobs.append((start - low, stop - low, band))
+    def work(job):
+        start, stop, (l, r, p) = job
+        return match_band(l, r, p, offsets, radius, subpixel=subpixel)[start:stop]
+    results = executor.map(work, jobs) if executor is not None else map(work, jobs)
+    return np.concatenate(list(results), axis=0)
+
+def estimate_disparity(left, right, max_disparity=None, radius=3, smallest=256, refine=2, workers=None):
+    '''
+    Estimate the disparity of every pixel of the left eye.
+
+    Parameters
+    ----------
+    left, right : array
+        The two eyes, as (rows x columns) grayscale arrays of the
+        same shape, which should already be lined up vertically
+        (see `Stereo.adjust`).
+    max_disparity : int
+        The biggest shift (in pixels, either way) to look for.
+        The default is an eighth of the width.
+    radius : int
+        The block around each pixel is (2*radius + 1) pixels square.
+    smallest : int
+        Shrink the pair (by halving) until it's no bigger than
+        this, and try every shift there.
+    refine : int
+        At each bigger scale, try shifts this many pixels
+        either way from those found at the scale below it.
+    workers : int
+        How many threads to use? (default is one per CPU)
+
+    Returns
+    -------
+    disparity : array
+        A (rows x columns) float32 array of how far (in pixels) each
+        pixel of the left eye is shifted in the right eye, so the
+        feature at column x on the left is at x + disparity on the right.
+    '''
+    left, right = np.asarray(left, dtype=np.float32), np.asarray(right, dtype=np.float32)
+    if left.shape != right.shape:
+        raise ValueError(f'The eyes have different sizes ({left.shape} and {right.shape}).')
+    if max_disparity is None:
+        max_disparity = max(1, left.shape[1]//8)
+
+    # make a pyramid of smaller and smaller copies of the pair
+    pyramid = [(left, right)]
+    while (max(pyramid[-1][0].shape) > smallest) and (min(pyramid[-1][0].shape) >= 2*(2*radius + 1)):
+        pyramid.append(tuple(halve(x) for x in pyramid[-1]))
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # try every shift on the smallest copy
+        scale = 2**(len(pyramid) - 1)
+        coarse = int(np.ceil(max_disparity/scale))
+        l, r = pyramid[-1]
+        disparity = match(l, r, np.zeros(l.shape, dtype=np.int32), range(-coarse, coarse + 1), radius,
+                          subpixel=len(pyramid) == 1, executor=executor)
+
+        # then refine those shifts on each bigger copy
+        for i in range(len(pyramid) - 2, -1, -1):
+            l, r = pyramid[i]
+            prior = upsample(disparity, l.shape)
+            disparity = match(l, r, prior, range(-refine, refine + 1), radius,
+                              subpixel=i == 0, executor=executor)
+    return disparity.astype(np.float32)
+
+def disparity_to_image(disparity, limits=None):
+    '''
+    Turn a disparity map into a grayscale image (bright = biggest disparity).
+
+    Parameters
+    ----------
+    disparity : array
+        A disparity map (from `estimate_disparity`).
+    limits : tuple
+        The (lowest, highest) disparity, which become black and white.
+        The default is the 1st and 99th percentiles of the map.
+
+    Returns
+    -------
+    image : PIL.Image
+        An 'L' mode image.
+    '''
+    low, high = limits if limits is not None else np.percentile(disparity, [1, 99])
+    scaled = (disparity - low)*(255/max(high - low, 1e-6))
+    return Image.fromarray(np.clip(scaled, 0, 255).astype(np.uint8))
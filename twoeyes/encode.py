@@ -0,0 +1,87 @@
+'''
+Named presets for how stereographs are encoded, trading off
+how fast they're made against how small the files are.
+
+Each preset can pick a file format (or leave it up to each
+output), and has keywords for PIL's `.save` for each format.
+Any `to_*` method takes `preset='small'` (or any other name
+here), and keywords passed to it override the preset's:
+
+    s.to_anaglyph(preset='small')
+    s.to_anaglyph(preset='webp', quality=70)
+'''
+from .imports import *
+from PIL import features
+
+__all__ = ['encoder_presets', 'available_presets']
+
+# for each preset, what file extension should be used (None keeps the
+# output's usual one), and what keywords should PIL get for each format?
+encoder_presets = {
+    # PIL's own defaults
+    'default': dict(extension=None, options={}),
+    # encode as quickly as possible
+    'fast': dict(extension=None, options={
+        'JPEG': dict(quality=85, optimize=False, progressive=False, subsampling='4:2:0'),
+        'MPO': dict(quality=85, subsampling='4:2:0'),
+        'PNG': dict(compress_level=1),
+        'WEBP': dict(quality=80, method=0),
+        'AVIF': dict(quality=60, speed=10),
+        'GIF': dict(optimize=False)}),
+    # make the files as small as possible (at a decent quality)
+    'small': dict(extension=None, options={
+        'JPEG': dict(quality=80, optimize=True, progressive=True, subsampling='4:2:0'),
+        'MPO': dict(quality=80, subsampling='4:2:0'),
+        'PNG': dict(optimize=True),
+        'WEBP': dict(quality=75, method=6),
+        'AVIF': dict(quality=55, speed=4),
+        'GIF': dict(optimize=True)}),
+    # keep as much detail as possible (especially the color of red/cyan edges)
+    'quality': dict(extension=None, options={
+        'JPEG': dict(quality=95, subsampling='4:4:4'),
+        'MPO': dict(quality=95, subsampling='4:4:4'),
+        'PNG': dict(compress_level=6),
+        'WEBP': dict(quality=95, method=4),
+        'AVIF': dict(quality=90, speed=6),
+        'GIF': dict(optimize=False)}),
+    # modern formats, which are much smaller than JPEG for the same quality
+    'webp': dict(extension='webp', options={'WEBP': dict(quality=80, method=4)}),
+    'avif': dict(extension='avif', options={'AVIF': dict(quality=60, speed=6)}),
+}
+
+def available_presets():
+    '''
+    List the presets that this installation of PIL can actually encode.
+    '''
+    available = []
+    for name, preset in encoder_presets.items():
+        extension = preset['extension']
+        if extension in ['webp', 'avif']:
+            if not features.check(extension):
+                continue
+        if (extension is None) or (Image.registered_extensions().get(f'.{extension}') in Image.SAVE):
+            available.append(name)
+    return available
+
+def preset_extension(preset, extension):
+    '''
+    Which file extension should an output use, under a preset?
+    '''
+    if preset is None:
+        return extension
+    if preset not in encoder_presets:
+        raise ValueError(f"preset must be one of {list(encoder_presets)}, not '{preset}'")
+    return encoder_presets[preset]['extension'] or extension
+
+def preset_options(preset, format, **overrides):
+    '''
+    Get the keywords for PIL's `.save` for a format under a
+    preset, with any other keywords overriding the preset's.
+    '''
+    if preset is None:
+        return dict(overrides)
+    if preset not in encoder_presets:
+        raise ValueError(f"preset must be one of {list(encoder_presets)}, not '{preset}'")
+    options = dict(encoder_presets[preset]['options'].get(format, {}))
+    options.update(overrides)
+    return options
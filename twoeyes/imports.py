@@ -1,9 +1,8 @@
-import os, sys, warnings
-import matplotlib.pyplot as plt, numpy as np
+import os, sys, io, re, threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, UnidentifiedImageError
 
-warnings.filterwarnings("ignore")
-from PIL import Image
-
-
-import pkg_resources
-data_directory = pkg_resources.resource_filename('twoeyes', 'data')
+# (the data directory is just next to this file, so there's
+#  no need to import anything heavy to find it)
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
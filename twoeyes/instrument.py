@@ -0,0 +1,177 @@
+'''
+Tools for keeping track of where the time (and memory) goes
+while making stereographs, one stage at a time.
+
+Every `Stereo` has a `tracer`. By default it's a `NullTracer`,
+which does (almost) nothing. To see what's happening, give it a
+`Tracer`, which measures each stage (open, decode, convert, rotate,
+compose, encode, write) and sends a record of it to any callbacks:
+
+    tracer = Tracer(callbacks=[print_stage])
+    s = Stereo('left.jpg', 'right.jpg', tracer=tracer)
+    s.to_anaglyph()
+'''
+from .imports import *
+import time, contextlib, tracemalloc
+
+__all__ = ['Tracer', 'NullTracer', 'print_stage']
+
+def print_stage(record):
+    '''
+    A callback that prints a one-line summary of each stage.
+    '''
+    details = [f"{record['seconds']*1000:8.1f}ms"]
+    for k, label in [('bytes_read', 'read'), ('bytes_written', 'wrote'), ('peak_bytes', 'peak')]:
+        if record.get(k) is not None:
+            details.append(f"{label} {record[k]/1024**2:.1f}MB")
+    for k in ['eye', 'output', 'filename']:
+        if record.get(k) is not None:
+            details.append(f'{k}={record[k]}')
+    print(f"{'  '*record['depth']}[{record['stage']}] " + ', '.join(details))
+
+def read_rss_peak():
+    '''
+    Read this process's peak resident memory in bytes (linux only).
+    '''
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])*1024
+
+def reset_rss_peak():
+    '''
+    Reset this process's peak resident memory (linux only).
+    '''
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+def read_rss():
+    '''
+    Read this process's current resident memory in bytes (linux only).
+    '''
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])*1024
+
+class NullTracer:
+    '''
+    A tracer that doesn't measure anything (which is the default).
+    '''
+    enabled = False
+
+    def stage(self, name, **info):
+        return contextlib.nullcontext({})
+
+class Tracer:
+    '''
+    A tracer that measures each stage of making stereographs.
+    '''
+    enabled = True
+
+    def __init__(self, callbacks=[], memory=False, keep=True):
+        '''
+        Parameters
+        ----------
+        callbacks : list of functions
+            Functions to call with the record (a dict) for each
+            stage, as it finishes (for example, `print_stage`, or
+            something that sends measurements to a metrics system).
+        memory : bool
+            Should the peak memory of each stage be measured too?
+            On linux this is the peak resident memory of the process
+            (which sees everything, including PIL's image buffers);
+            elsewhere it's the peak of Python's traced allocations
+            (which sees numpy arrays but not PIL's image buffers).
+            Either way, it's for the whole process, so it gets muddled
+            if stages are running at the same time in other threads.
+        keep : bool
+            Should the records be kept in `.records`?
+        '''
+        self.callbacks = list(callbacks)
+        self.memory = memory
+        self.keep = keep
+        self.records = []
+        self.local = threading.local()
+
+        # figure out how to measure memory
+        if memory:
+            try:
+                reset_rss_peak()
+                self.read_peak, self.reset_peak, self.read_current = read_rss_peak, reset_rss_peak, read_rss
+            except OSError:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                self.read_peak = lambda: tracemalloc.get_traced_memory()[1]
+                self.reset_peak = tracemalloc.reset_peak
+                self.read_current = lambda: tracemalloc.get_traced_memory()[0]
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        '''
+        Measure one stage, as a context manager.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage.
+        **info
+            Anything else to include in the record. The record
+            is handed back by the context manager, so things like
+            'bytes_read' or 'bytes_written' can be filled in later.
+        '''
+        stack = self.local.__dict__.setdefault('stack', [])
+        record = dict(stage=name, depth=len(stack), bytes_read=None, bytes_written=None, peak_bytes=None, **info)
+
+        # (stages can be nested, so the peak of an outer stage
+        #  has to include the peaks of stages inside it)
+        if self.memory:
+            peak = self.read_peak()
+            for outer in stack:
+                outer['highest'] = max(outer['highest'], peak)
+            self.reset_peak()
+            record['start'] = self.read_current()
+            record['highest'] = record['start']
+
+        stack.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            stack.pop()
+            if self.memory:
+                peak = self.read_peak()
+                for r in stack + [record]:
+                    r['highest'] = max(r['highest'], peak)
+                record['peak_bytes'] = record.pop('highest') - record.pop('start')
+            self.emit(record)
+
+    def emit(self, record):
+        '''
+        Send a record to the callbacks (and keep it).
+        '''
+        if self.keep:
+            self.records.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    def totals(self):
+        '''
+        Add up the time and bytes spent in each stage.
+
+        Returns
+        -------
+        totals : dict
+            For each stage, a dictionary with 'count', 'seconds',
+            'bytes_read', 'bytes_written', and the largest 'peak_bytes'.
+        '''
+        totals = {}
+        for record in self.records:
+            t = totals.setdefault(record['stage'], dict(count=0, seconds=0, bytes_read=0, bytes_written=0, peak_bytes=0))
+            t['count'] += 1
+            t['seconds'] += record['seconds']
+            t['bytes_read'] += record['bytes_read'] or 0
+            t['bytes_written'] += record['bytes_written'] or 0
+            t['peak_bytes'] = max(t['peak_bytes'], record['peak_bytes'] or 0)
+        return totals
@@ -1,10 +1,8 @@
 from .imports import *
-from PIL import Image
-from pillow_heif import register_heif_opener
-register_heif_opener()
-from .stereo import Stereo
-from ipywidgets import GridspecLayout, FileUpload, Output, Layout, VBox, HBox, Box, Checkbox, Button, RadioButtons, Label
+from .stereo import Stereo, open_image
+from ipywidgets import GridspecLayout, FileUpload, Output, Layout, VBox, HBox, Box, Checkbox, Button, RadioButtons, ToggleButtons, Label, IntProgress
 from IPython.display import clear_output, display, HTML
+from IPython.display import Image as DisplayImage
 from textwrap import wrap
 
 __all__ = ['MakeYourOwn']
@@ -51,6 +49,17 @@ class MakeYourOwn(Stereo):
         Stereo.__init__(self, prefix=prefix)
         self.thumbnails = dict(left=None, right=None)
 
+        # make a tiny stereograph from the thumbnails, for previews
+        # (it remembers the grayscale thumbnails, and rotated copies)
+        self.preview = Stereo()
+
+        # make stereographs in the background, one job at a time
+        # (each job gets a number, so we can tell when it's out of date)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.job = None
+        self.job_number = 0
+        self.job_started_as = None
+
         # set initial instructions
         self.reset_instructions('Hi! Please upload two images to make a 3D image.')
         display(everything)
@@ -70,12 +79,13 @@ class MakeYourOwn(Stereo):
         options = HBox([labeled_rotation, todo], layout=Layout(width=f'{width}px', margin=f'0px {padding}px 0px {padding}px'))
 
         # group the widgets into layouts
-        actions_together = HBox([options, self.widgets['make-button']])
+        actions_together = HBox([options, VBox([self.widgets['make-button'], self.widgets['progress']])])
         eyes_together = HBox([self.widgets['left-vbox'],
                               self.widgets['right-vbox']],
                               layout=Layout())
         everything = VBox([self.widgets['instructions'],
                            eyes_together,
+                           self.widgets['preview-vbox'],
                            actions_together,
                            self.widgets['outputs']])
         return everything
@@ -97,8 +107,10 @@ class MakeYourOwn(Stereo):
         everything = VBox([self.widgets['instructions'],
                            self.widgets['left-vbox'],
                            self.widgets['right-vbox'],
+                           self.widgets['preview-vbox'],
                            options,
                            self.widgets['make-button'],
+                           self.widgets['progress'],
                            self.widgets['outputs']],
                            layout=Layout(width=f'{width+padding*2}px'))
         return everything
@@ -158,6 +170,14 @@ class MakeYourOwn(Stereo):
         #self.widgets['do-sidebyside'] = Checkbox(value=False, description='sidebyside', layout=Layout(width='auto'))
 
 
+        # create widgets for a quick preview (from the thumbnails)
+        self.widgets['preview-type'] = ToggleButtons(options=['red/cyan', 'wiggle'], value='red/cyan',
+                                                     description='', style=dict(button_width=f'{width/3:.0f}px'))
+        self.widgets['preview'] = Output(layout=Layout(width=f'{total}px'))
+        self.widgets['preview-vbox'] = VBox([HBox([Label('Preview:'), self.widgets['preview-type']]),
+                                            self.widgets['preview']],
+                                            layout=Layout(align_items='center', padding=f'{padding}px'))
+
         # create widget for making the stereographs
         self.widgets['make-button'] = Button(description='Make stereograph(s)!',
                       tooltip='Make stereograph(s)!',
@@ -165,6 +185,10 @@ class MakeYourOwn(Stereo):
                       layout=Layout(width=f'{width}px', margin=f'0px {padding}px 0px {padding}px'))
 
 
+        # create widget to show progress (hidden until it's needed)
+        self.widgets['progress'] = IntProgress(value=0, min=0, max=1,
+                      layout=Layout(width=f'{width}px', margin=f'0px {padding}px 0px {padding}px', visibility='hidden'))
+
         # create widget for outputs
         self.widgets['outputs'] = Output(layout=Layout(width=f'{total}px'))
 
@@ -182,6 +206,9 @@ class MakeYourOwn(Stereo):
         # watch the rotation updates
         self.widgets['rotation'].observe(self.update_rotation, names='value')
 
+        # watch for changes to the kind of preview
+        self.widgets['preview-type'].observe(self.update_preview, names='value')
+
         # watch the button click
         self.widgets['make-button'].on_click(self.make_stereographs)
 
@@ -198,12 +225,17 @@ class MakeYourOwn(Stereo):
             clear_output()
             print('\n'.join(wrap(message, characters)))
 
-    def rotate_image(self, image):
-        try:
-            rotation = float(self.widgets['rotation'].value[:-1])
-            return image.rotate(rotation, expand=True)
-        except AttributeError:
-            return image
+    @property
+    def rotation(self):
+        '''
+        By how many degrees (counterclockwise) are the images rotated?
+        (This comes from the rotation widget.)
+        '''
+        return float(self.widgets['rotation'].value[:-1])
+
+    @rotation.setter
+    def rotation(self, rotation):
+        self.widgets['rotation'].value = f'{rotation:.0f}˚'
 
 
     def display_image(self, eye):
@@ -216,8 +248,33 @@ class MakeYourOwn(Stereo):
 
 
     def update_rotation(self, change):
+        self.cancel_job()
         for eye in ['left', 'right']:
             self.display_image(eye)
+        self.update_preview()
+
+    def update_preview(self, change=None):
+        '''
+        Show a quick preview of the stereograph, made from the
+        thumbnails (so it's fast enough to redo after every change).
+
+        The grayscale thumbnails are remembered (and so are rotated
+        copies of them), so changing the rotation only has to
+        rotate and merge a couple of small images.
+        '''
+        if (self.thumbnails['left'] is None) or (self.thumbnails['right'] is None):
+            return
+        with self.widgets['preview']:
+            clear_output()
+            if self.thumbnails['left'].size != self.thumbnails['right'].size:
+                print('(The images need to be the same size for a preview.)')
+                return
+            self.preview.rotation = self.rotation
+            if self.widgets['preview-type'].value == 'red/cyan':
+                display(self.preview.to_anaglyph(sink='image'))
+            else:
+                wiggle = self.preview.to_animation(sink='bytes', format='gif', colors=64, duration=300)
+                display(DisplayImage(data=wiggle, format='gif'))
 
 
     def update_image_text(self, eye):
@@ -225,7 +282,7 @@ class MakeYourOwn(Stereo):
         with self.widgets[f'{eye}-text-output']:
             clear_output()
             actual_width, actual_height = self.images[eye].width, self.images[eye].height
-            rotation = float(self.widgets['rotation'].value[:-1])
+            rotation = self.rotation
             if (rotation == 0) or (rotation == 180):
                 width, height = actual_width, actual_height
             else:
@@ -234,17 +291,17 @@ class MakeYourOwn(Stereo):
 
     def update_image(self, change):
         '''
-        Update an image by saving it,
-        loading it, and displaying it.
+        Update an image by reading it straight
+        from the uploaded bytes, making a
+        thumbnail, and displaying it.
 
-        (Could probably be faster
-        with directly reading the
-        image from bytestream in
-        the uploaded file...)
+        (The full-resolution image isn't
+        decoded until a stereograph needs it.)
         '''
 
         # figure out the filename
         eye = change['owner'].description.split(' ')[1]
+        self.cancel_job()
         
         # for some reasons uploading is slightly different locally than in colab
         if self.colab:
@@ -257,28 +314,32 @@ class MakeYourOwn(Stereo):
         # provide an update that this will take a while
         self.reset_instructions(f'File {filename} is loading.\nPlease have patience (or upload a smaller image).')
 
-        # save the file, with its original extension
-        extension = filename.split('.')[-1]
+        # get the bytes of the uploaded file
         self.filenames[eye] = filename
         if self.colab:
             file = uploaded.value[filename]
-            bytes = file['content']
+            content = file['content']
         else:
-            bytes = uploaded['content']
-        local_image_filename = f'{eye}.{extension}'
-        with open(local_image_filename,'wb') as f:
-            f.write(bytes)
-        
-        # load that file as a PIL image
-        self.images[eye] = Image.open(local_image_filename)
+            content = uploaded['content']
+        content = bytes(content)
+
+        # open those bytes as a PIL image (which only reads the header)
+        self.images[eye] = open_image(io.BytesIO(content))
         aspect = self.images[eye].width/self.images[eye].height
         if aspect > 1:
             thumb_size = round(self.width*aspect), self.width
         else:
             thumb_size = self.width, round(self.width/aspect)
-        self.thumbnails[eye] = self.images[eye].copy()
-        self.thumbnails[eye].thumbnail(thumb_size)
+
+        # make a thumbnail from a separate copy of the bytes, letting the
+        # decoder shrink the image as it reads it (for JPEG, in "draft" mode)
+        thumbnail = open_image(io.BytesIO(content))
+        thumbnail.draft(None, thumb_size)
+        thumbnail.thumbnail(thumb_size)
+        self.thumbnails[eye] = thumbnail
+        self.preview.images[eye] = thumbnail
         self.display_image(eye)
+        self.update_preview()
 
         self.update_image_text(eye)
 
@@ -294,20 +355,29 @@ class MakeYourOwn(Stereo):
 
     def write_output(self, message=''):
         '''
-        Clear the instructions and add new text.
+        Add new text to the outputs.
+        (This is safe to call from a background thread.)
         '''
         if self.phone:
             characters = 30
         else:
             characters = 70
-        with self.widgets['outputs']:
-            print('\n'.join(wrap(message, characters)) + '\n')
+        self.widgets['outputs'].append_stdout('\n'.join(wrap(message, characters)) + '\n\n')
 
 
     def make_stereographs(self, change):
         '''
         Produce stereographs when the button is pressed.
+
+        The work happens in the background, so the notebook
+        (and the rest of the widgets) stay responsive.
         '''
+
+        # ignore extra clicks while the current job is running (a cancelled
+        # job may still be finishing, but a new one just queues up behind it)
+        if (self.job_started_as == self.job_number) and not self.job.done():
+            return
+
         with self.widgets['outputs']:
             clear_output()
 
@@ -321,21 +391,104 @@ class MakeYourOwn(Stereo):
             self.write_output('Please upload images that are the same size!')
             return
 
+        # decide what to make
+        todo = []
         if self.widgets['do-redcyan'].value:
-            filename = self.to_anaglyph()
-            self.display_stereograph(filename)
+            todo.append('red-cyan')
         if self.widgets['do-gif'].value:
-            filename = self.to_gif()
-            #self.display_stereograph(filename)
+            todo.append('animated')
+        if len(todo) == 0:
+            return
+
+        # show that something is happening, and start the job
+        self.job_number += 1
+        self.show_progress(0, 2*len(todo))
+        self.job = self.executor.submit(self.run_job, self.job_number, todo)
+        self.job_started_as = self.job_number
 
-    def display_stereograph(self, filename):
+    def show_progress(self, value, maximum=None):
+        '''
+        Update the progress bar (and disable the button while it's running).
         '''
-        Display a stereograph from a file.
+        progress = self.widgets['progress']
+        if maximum is not None:
+            progress.max = maximum
+        progress.value = value
+        running = value < progress.max
+        progress.layout.visibility = 'visible' if running else 'hidden'
+        self.widgets['make-button'].disabled = running
+        self.widgets['make-button'].description = 'Making stereograph(s)...' if running else 'Make stereograph(s)!'
+
+    def cancel_job(self):
         '''
+        Cancel a job that's in progress (if there is one).
 
-        with self.widgets['outputs']:
-            #self.write_output(f'Displaying stereograph (may take a moment).')
-            #if self.colab:
-            #    self.write_output('''Use the File Browser (📁) at left to access all newly created stereographic image files for download.''')
-            i = Image.open(filename)
-            display(i)
+        A job that hasn't started yet is cancelled outright, and
+        a job that's running will stop at its next step, without
+        saving or showing anything more.
+        '''
+        if (self.job is not None) and not self.job.done():
+            self.job_number += 1
+            self.job.cancel()
+            self.show_progress(self.widgets['progress'].max)
+
+    def run_job(self, job_number, todo):
+        '''
+        Make stereographs (in a background thread).
+
+        Parameters
+        ----------
+        job_number : int
+            Which job is this? If `self.job_number` changes
+            while it's running, the job stops early.
+        todo : list of str
+            Which outputs to make, from 'red-cyan', 'animated'.
+        '''
+        def current():
+            return job_number == self.job_number
+
+        def advance(step):
+            # (a job that's been cancelled shouldn't move the progress bar)
+            if current():
+                self.widgets['progress'].value = step
+
+        # which method makes each output, and what kind of file is it?
+        methods = {'red-cyan': ('to_anaglyph', 'jpg'),
+                   'animated': ('to_gif', 'gif')}
+
+        try:
+            step = 0
+            for kind in todo:
+                if not current():
+                    return
+                method, extension = methods[kind]
+                encoded = getattr(self, method)(sink='bytes')
+                step += 1
+                advance(step)
+
+                if not current():
+                    return
+                filename = self.write_encoded(encoded, kind, extension)
+                if kind == 'red-cyan':
+                    self.display_stereograph(filename)
+                step += 1
+                advance(step)
+        except Exception as e:
+            if current():
+                self.write_output(f'Something went wrong: {type(e).__name__}: {e}')
+        finally:
+            if current():
+                self.show_progress(self.widgets['progress'].max)
+
+    def display_stereograph(self, image):
+        '''
+        Display a stereograph, from a PIL image or a file.
+        '''
+
+        #self.write_output(f'Displaying stereograph (may take a moment).')
+        #if self.colab:
+        #    self.write_output('''Use the File Browser (📁) at left to access all newly created stereographic image files for download.''')
+        if isinstance(image, str):
+            image = Image.open(image)
+        # (this is safe to call from a background thread)
+        self.widgets['outputs'].append_display_data(image)
@@ -11,6 +11,7 @@ class iplot():
             self.indent()
 
         # create a gridspec object
+        import matplotlib.pyplot as plt
         self.gs = plt.matplotlib.gridspec.GridSpec(nRows,nCols,**kwargs)
         self.figure = plt.gcf()
         self.figure.set_facecolor('white')
@@ -28,6 +29,7 @@ class iplot():
     def subplot(self, row=0, col=0,rowspan=1,colspan=1,name=None, **kwargs):
         # create the axis object, using the gridspec language
         #    for example,
+        import matplotlib.pyplot as plt
 
         ax = plt.subplot(self.gs[row:row + rowspan, col:col + colspan], **kwargs)
         if name == None:
@@ -86,6 +88,7 @@ class iplot():
         return self.mouseClicks
 
     def start(self):
+        import matplotlib.pyplot as plt
         self.connect()
         plt.draw()
         self.figure.canvas.start_event_loop(0)
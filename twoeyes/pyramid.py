@@ -0,0 +1,145 @@
+'''
+Tools for making many resolutions of a stereograph at once
+(for web viewers), from one image that's only composed once.
+
+Each level of the pyramid is half the size of the one before,
+made by averaging 2x2 blocks of the level above it (so no level
+is ever made from the full-resolution image more than once). The
+levels can be saved as images of their own, and/or cut into tiles
+for deep-zoom viewers (in the Deep Zoom `.dzi` layout that viewers
+like OpenSeadragon understand). Everything is encoded at the same
+time on a pool of threads (PIL lets go of the GIL while it encodes).
+'''
+from .imports import *
+
+__all__ = ['make_levels', 'write_pyramid']
+
+def make_levels(image, smallest=1):
+    '''
+    Make a pyramid of images, each half the size of the one before.
+
+    Parameters
+    ----------
+    image : PIL.Image
+        The full-resolution image.
+    smallest : int
+        Keep halving until the largest dimension is no more than this.
+        (With 1, there are as many levels as Deep Zoom expects.)
+
+    Returns
+    -------
+    levels : list of PIL.Image
+        The images, from full-resolution down to the smallest.
+    '''
+    levels = [image]
+    while max(levels[-1].size) > smallest:
+        levels.append(levels[-1].reduce(2))
+    return levels
+
+def tile_boxes(size, tile_size=254, overlap=1):
+    '''
+    Cut an image of a given (width, height) into Deep Zoom tiles.
+
+    Returns
+    -------
+    boxes : list of tuples
+        The (column, row, (left, upper, right, lower)) of each tile.
+    '''
+    width, height = size
+    boxes = []
+    for column in range((width + tile_size - 1)//tile_size):
+        for row in range((height + tile_size - 1)//tile_size):
+            left = column*tile_size - (overlap if column > 0 else 0)
+            upper = row*tile_size - (overlap if row > 0 else 0)
+            right = min(width, (column + 1)*tile_size + overlap)
+            lower = min(height, (row + 1)*tile_size + overlap)
+            boxes.append((column, row, (left, upper, right, lower)))
+    return boxes
+
+def write_dzi(filename, size, tile_size=254, overlap=1, extension='jpg'):
+    '''
+    Write the Deep Zoom descriptor that tells a viewer where to find the tiles.
+    '''
+    with open(filename, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{extension}" '
+                f'Overlap="{overlap}" TileSize="{tile_size}">\n'
+                f'  <Size Width="{size[0]}" Height="{size[1]}"/>\n'
+                '</Image>\n')
+
+def save_image(image, filename, box=None, **kwargs):
+    '''
+    Save an image (or a box cut out of it), returning the number of bytes written.
+    '''
+    if box is not None:
+        image = image.crop(box)
+    image.save(filename, **kwargs)
+    return os.path.getsize(filename)
+
+def write_pyramid(image, filename, levels=True, tiles=False, smallest=256,
+                  tile_size=254, overlap=1, max_workers=None, **kwargs):
+    '''
+    Save an image at many resolutions, and/or as deep-zoom tiles.
+
+    Parameters
+    ----------
+    image : PIL.Image
+        The full-resolution image.
+    filename : str
+        Where to save the full-resolution image (like `image-000.jpg`).
+        The other levels go next to it (as `image-000-512w.jpg`, ...), and
+        the tiles go into `image-000_files/` (described by `image-000.dzi`).
+    levels : bool
+        Should each level be saved as an image of its own?
+    tiles : bool
+        Should each level be cut into tiles for a deep-zoom viewer?
+    smallest : int
+        Only save levels at least this wide (and always the full
+        resolution one). Tiles are made all the way down to 1 pixel.
+    tile_size : int
+        The width and height of each tile (not counting the overlap).
+    overlap : int
+        By how many pixels should neighboring tiles overlap?
+    max_workers : int
+        How many threads to use for encoding? (default is one per CPU)
+    **kwargs
+        Keywords passed along to PIL's `.save`.
+
+    Returns
+    -------
+    pyramid : dict
+        'levels' = a list of (width, height, filename) for each saved level,
+        'dzi' = the Deep Zoom descriptor (or None),
+        'tiles' = how many tiles were saved,
+        'bytes_written' = how many bytes were written in total.
+    '''
+    stem, extension = os.path.splitext(filename)
+    extension = extension.strip('.')
+    pyramid = make_levels(image, smallest=1 if tiles else smallest)
+
+    # list everything that needs to be encoded
+    todo, saved = [], []
+    if levels:
+        for i, level in enumerate(pyramid):
+            if (i > 0) and (level.width < smallest):
+                break
+            level_filename = filename if i == 0 else f'{stem}-{level.width}w.{extension}'
+            todo.append((level, level_filename, None))
+            saved.append((level.width, level.height, level_filename))
+    dzi = None
+    if tiles:
+        dzi = f'{stem}.dzi'
+        write_dzi(dzi, image.size, tile_size=tile_size, overlap=overlap, extension=extension)
+        for i, level in enumerate(pyramid):
+            # (deep zoom numbers the levels up from 1 pixel)
+            directory = os.path.join(f'{stem}_files', str(len(pyramid) - 1 - i))
+            os.makedirs(directory, exist_ok=True)
+            for column, row, box in tile_boxes(level.size, tile_size=tile_size, overlap=overlap):
+                todo.append((level, os.path.join(directory, f'{column}_{row}.{extension}'), box))
+
+    # encode them all at once
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(save_image, level, f, box, **kwargs) for level, f, box in todo]
+        bytes_written = sum(future.result() for future in futures)
+
+    return dict(levels=saved, dzi=dzi, tiles=len(todo) - len(saved), bytes_written=bytes_written)
@@ -0,0 +1,214 @@
+'''
+Tools for making stereographs from stereo video, as two ordered
+sequences of frames (one per eye).
+
+Frames stream through a small pool of worker threads, each of which
+reads one pair of frames, combines them, and encodes the result.
+Only a few frames are ever in flight at once, so memory stays the
+same no matter how long the sequence is, and the results come out
+in the same order the frames went in.
+'''
+from .imports import *
+from . import compose
+from .streaming import open_raster
+import collections
+
+__all__ = ['list_frames', 'compose_frames', 'stream_frames']
+
+# for each kind of output, what's it called and how is it made?
+frame_kinds = {'anaglyph': ('red-cyan', compose.anaglyph),
+               'sidebyside': ('side-by-side', compose.sidebyside)}
+
+def natural_key(filename):
+    '''
+    Sort filenames so `frame-2` comes before `frame-10`.
+    '''
+    return [int(x) if x.isdigit() else x.lower() for x in re.split(r'(\d+)', filename)]
+
+def list_frames(directory):
+    '''
+    List the frames in a directory, in order.
+
+    Parameters
+    ----------
+    directory : str
+        A directory of images (or .npy arrays), one per frame,
+        whose filenames sort into the order of the frames.
+
+    Returns
+    -------
+    filenames : list of str
+        The frames, sorted naturally (so `frame-2` comes before `frame-10`).
+    '''
+    extensions = set(Image.registered_extensions()) | {'.npy'}
+    filenames = [f for f in os.listdir(directory)
+                 if os.path.splitext(f)[-1].lower() in extensions and not f.startswith('.')]
+    return [os.path.join(directory, f) for f in sorted(filenames, key=natural_key)]
+
+def iterate_frames(source):
+    '''
+    Turn a directory (or anything iterable) into an iterator of frames.
+    '''
+    if isinstance(source, (str, os.PathLike)):
+        return iter(list_frames(source))
+    return iter(source)
+
+def pair_frames(left, right):
+    '''
+    Step through two sequences of frames together,
+    complaining if one of them runs out first.
+    '''
+    left, right = iterate_frames(left), iterate_frames(right)
+    missing = object()
+    for i, l in enumerate(left):
+        r = next(right, missing)
+        if r is missing:
+            raise ValueError(f'the right sequence ran out of frames after {i}')
+        yield i, l, r
+    if next(right, missing) is not missing:
+        raise ValueError('the left sequence ran out of frames before the right one')
+
+def read_frame(frame):
+    '''
+    Get a frame (a filename, PIL image, or array) as a uint8 array.
+    '''
+    if isinstance(frame, Image.Image):
+        if frame.mode not in ['L', 'RGB']:
+            frame = frame.convert('RGB')
+        return np.asarray(frame)
+    return np.asarray(open_raster(frame))
+
+def make_frame(kind, left, right):
+    '''
+    Read one pair of frames and combine them.
+    '''
+    left, right = read_frame(left), read_frame(right)
+    if left.shape[:2] != right.shape[:2]:
+        raise ValueError(f'the frames have different shapes ({left.shape} and {right.shape})')
+    if (kind == 'sidebyside') and (left.ndim != right.ndim):
+        left, right = [np.dstack([x]*3) if x.ndim == 2 else x for x in [left, right]]
+    return frame_kinds[kind][1](left, right)
+
+def encode_frame(frame, extension, **kwargs):
+    '''
+    Encode a frame (as an array) into bytes.
+    '''
+    format = Image.registered_extensions().get(f'.{extension}')
+    if format is None:
+        raise ValueError(f"PIL doesn't know how to save '.{extension}' files")
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+def map_in_order(function, items, workers=None, ahead=2):
+    '''
+    Apply a function to items on a pool of threads, yielding the
+    results in order, with at most `ahead*workers` items in flight.
+    '''
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(function, *item))
+            if len(pending) >= ahead*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def compose_frames(left, right, kind='anaglyph', workers=None):
+    '''
+    Combine two sequences of frames, one pair at a time.
+
+    Parameters
+    ----------
+    left, right : str or iterable
+        The frames for each eye, as a directory of images (see
+        `list_frames`), or as anything that can be iterated over to
+        get filenames, PIL images, or (rows x columns [x 3]) arrays.
+        Generators are fine; frames are only taken as they're needed.
+    kind : str
+        'anaglyph' or 'sidebyside'
+    workers : int
+        How many threads to use? (default is one per CPU)
+
+    Returns
+    -------
+    frames : generator
+        The combined frames (as arrays), in order.
+    '''
+    if kind not in frame_kinds:
+        raise ValueError(f"'{kind}' is not one of {list(frame_kinds)}")
+    def work(i, l, r):
+        return make_frame(kind, l, r)
+    return map_in_order(work, pair_frames(left, right), workers=workers)
+
+def stream_frames(left, right, kind='anaglyph', directory='', sink=None,
+                  prefix='frame', extension='jpg', workers=None, **kwargs):
+    '''
+    Make a stereograph for every frame of two sequences, in order.
+
+    Parameters
+    ----------
+    left, right : str or iterable
+        The frames for each eye (see `compose_frames`).
+    kind : str
+        'anaglyph' or 'sidebyside'
+    directory : str
+        The directory into which numbered frames should be saved
+        (as `{prefix}-{kind}-000000.{extension}`, ...). Frames
+        already there with the same names are overwritten.
+    sink : None, file-like, or function
+        Where should the frames go? Options are:
+            None = save numbered frames into `directory`
+            file-like = write each encoded frame to it, one after
+                        another (for example, to the stdin of ffmpeg
+                        reading `-f image2pipe`)
+            function = call it with each combined frame (as an array)
+    prefix : str
+        The start of the filename for each numbered frame.
+    extension : str
+        The file extension (and so the format) for encoded frames.
+    workers : int
+        How many threads to use? (default is one per CPU)
+    **kwargs
+        Keywords passed along to PIL's `.save`.
+
+    Returns
+    -------
+    output : list of str, or int
+        The filenames of the numbered frames (or, for
+        other sinks, the number of frames that were made).
+    '''
+    if kind not in frame_kinds:
+        raise ValueError(f"'{kind}' is not one of {list(frame_kinds)}")
+    label = frame_kinds[kind][0]
+
+    # decide what each worker should do with its pair of frames
+    if sink is None:
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        def work(i, l, r):
+            filename = os.path.join(directory, f'{prefix}-{label}-{i:06.0f}.{extension}')
+            with open(filename, 'wb') as f:
+                f.write(encode_frame(make_frame(kind, l, r), extension, **kwargs))
+            return filename
+    elif hasattr(sink, 'write'):
+        def work(i, l, r):
+            return encode_frame(make_frame(kind, l, r), extension, **kwargs)
+    elif callable(sink):
+        def work(i, l, r):
+            return make_frame(kind, l, r)
+    else:
+        raise ValueError(f'{sink} is not a file-like object or a function')
+
+    # hand the results along, in order
+    filenames, count = [], 0
+    for result in map_in_order(work, pair_frames(left, right), workers=workers):
+        if sink is None:
+            filenames.append(result)
+        elif hasattr(sink, 'write'):
+            sink.write(result)
+        else:
+            sink(result)
+        count += 1
+    return filenames if sink is None else count
@@ -0,0 +1,310 @@
+'''
+A small HTTP service for making stereographs, which keeps a pool of
+worker processes warm (with twoeyes already imported and exercised),
+so each request only pays for the work of making its own stereograph.
+
+Send a POST to `/render` with the two images as a multipart form
+(with fields called `left` and `right`, or just `left` for one file
+with both eyes in it, like an MPO), and the stereograph comes back
+as the body of the response. For example, with curl:
+
+    curl -F left=@some-left.jpg -F right=@some-right.jpg \
+         'http://localhost:8030/render?output=anaglyph' > anaglyph.jpg
+
+The query can include `output` (any of `Stereo.output_methods`) and
+`rotation` (in degrees). Requests wait in a queue for a free worker;
+if too many are already waiting, the service says so right away
+(with 503 and a `Retry-After` header), rather than falling behind.
+If a worker dies (say, killed for running out of memory), the pool is
+restarted, and the requests it was working on get 503 (to try again).
+`GET /health` describes how busy the service is.
+'''
+from .imports import *
+import json, optparse
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+__all__ = ['make_server']
+
+def warm_up():
+    '''
+    Get a worker process ready, by importing twoeyes and making
+    a tiny stereograph (so nothing is slow the first time).
+    '''
+    from .stereo import Stereo
+    tiny = np.zeros((8, 8, 3), dtype=np.uint8)
+    Stereo(tiny, tiny).to_anaglyph(sink='bytes')
+    return os.getpid()
+
+def render_upload(left, right=None, output='anaglyph', rotation=0):
+    '''
+    Make a stereograph from uploaded bytes (in a worker process).
+
+    Parameters
+    ----------
+    left, right : bytes
+        The encoded images (or one file with both eyes, as `left`).
+    output : str
+        Which kind of stereograph? (any of `Stereo.output_methods`)
+    rotation : float
+        By how many degrees (counterclockwise) should the images be rotated?
+
+    Returns
+    -------
+    encoded : bytes
+        The encoded stereograph.
+    content_type : str
+        Its MIME type.
+    '''
+    from .stereo import Stereo
+    s = Stereo(io.BytesIO(left), None if right is None else io.BytesIO(right), rotation=rotation)
+    buffer = io.BytesIO()
+    getattr(s, Stereo.output_methods[output])(sink=buffer)
+    format = Image.open(io.BytesIO(buffer.getvalue())).format
+    return buffer.getvalue(), Image.MIME.get(format, 'application/octet-stream')
+
+def parse_form(content_type, body):
+    '''
+    Pull the files out of a multipart form.
+
+    Returns
+    -------
+    files : dict
+        The bytes of each field in the form.
+    '''
+    message = BytesParser(policy=HTTP).parsebytes(b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+    if not message.is_multipart():
+        raise ValueError('please upload the images as a multipart form')
+    return {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+            for part in message.iter_parts()}
+
+class RenderHandler(BaseHTTPRequestHandler):
+    '''
+    Handle requests to the render service.
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def respond(self, status, body, content_type='application/json', headers={}):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self.respond(404, dict(error=f'{self.path} not found'))
+        self.respond(200, self.server.describe())
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/render':
+            return self.respond(404, dict(error=f'{url.path} not found'))
+
+        # check the size of the request
+        length = int(self.headers.get('Content-Length', 0))
+        if length > self.server.max_upload_bytes:
+            self.close_connection = True
+            return self.respond(413, dict(error=f'uploads are limited to {self.server.max_upload_bytes} bytes'))
+
+        # wait in line for a worker (or give up, if the line is too long,
+        # without reading the upload, so turning it away costs no memory)
+        if not self.server.join_queue():
+            self.close_connection = True
+            return self.respond(503, dict(error='too busy, please try again soon'),
+                                headers={'Retry-After': str(self.server.retry_after)})
+        try:
+            status, body, content_type, headers = self.render(url, length)
+        except Exception as e:
+            status, body, content_type, headers = 500, dict(error=f'{type(e).__name__}: {e}'), None, {}
+        finally:
+            self.server.leave_queue()
+        self.respond(status, body, content_type=content_type or 'application/json', headers=headers)
+
+    def render(self, url, length):
+        '''
+        Read a render request, and make its stereograph (once it has a
+        place in the queue), returning (status, body, content_type, headers).
+        '''
+
+        # read (and check) the request
+        body = self.rfile.read(length)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        output = query.get('output', 'anaglyph')
+        try:
+            from .stereo import Stereo
+            if output not in Stereo.output_methods:
+                raise ValueError(f"output must be one of {list(Stereo.output_methods)}, not '{output}'")
+            rotation = float(query.get('rotation', 0))
+            files = parse_form(self.headers.get('Content-Type', ''), body)
+            if files.get('left') is None:
+                raise ValueError("please upload a 'left' image (and a 'right' one, unless 'left' has both eyes)")
+        except ValueError as e:
+            return 400, dict(error=str(e)), None, {}
+        del body  # (the files have been copied out of it)
+
+        # make the stereograph
+        executor = self.server.executor
+        try:
+            future = executor.submit(render_upload, files['left'], files.get('right'), output, rotation)
+            encoded, content_type = future.result()
+        except BrokenProcessPool:
+            # (a worker died, so start a fresh pool for the requests to come)
+            self.server.restart_workers(executor)
+            return (503, dict(error='a worker failed, please try again'), None,
+                    {'Retry-After': str(self.server.retry_after)})
+        except (ValueError, OSError, Image.DecompressionBombError) as e:
+            # (the images couldn't be read, or couldn't be made into a stereograph)
+            return 422, dict(error=f'{type(e).__name__}: {e}'), None, {}
+        return 200, encoded, content_type, {}
+
+class RenderServer(ThreadingHTTPServer):
+    '''
+    An HTTP server with a pool of warm worker processes behind it.
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, max_pending=None, max_upload_bytes=100*1024**2,
+                 retry_after=1, verbose=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = 4*self.workers if max_pending is None else max_pending
+        self.max_upload_bytes = max_upload_bytes
+        self.retry_after = retry_after
+        self.verbose = verbose
+
+        # start the workers
+        self.executor = self.start_workers()
+        self.executor_lock = threading.Lock()
+
+        # keep track of how many requests are rendering or waiting to
+        self.pending = 0
+        self.pending_lock = threading.Lock()
+        ThreadingHTTPServer.__init__(self, address, RenderHandler)
+
+    def start_workers(self):
+        '''
+        Start a pool of worker processes, and make sure each has warmed up.
+        '''
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+        for future in [executor.submit(os.getpid) for i in range(self.workers)]:
+            future.result()
+        return executor
+
+    def restart_workers(self, broken):
+        '''
+        Replace a broken pool of workers with a fresh one (unless
+        another request has already replaced it).
+        '''
+        with self.executor_lock:
+            if self.executor is broken:
+                self.executor = self.start_workers()
+                broken.shutdown(wait=False, cancel_futures=True)
+
+    def join_queue(self):
+        '''
+        Take a place in the queue for a worker (returning False if it's full).
+        '''
+        with self.pending_lock:
+            if self.pending >= self.max_pending:
+                return False
+            self.pending += 1
+            return True
+
+    def leave_queue(self):
+        '''
+        Give up a place in the queue.
+        '''
+        with self.pending_lock:
+            self.pending -= 1
+
+    def describe(self):
+        '''
+        Describe how busy the server is.
+        '''
+        return dict(workers=self.workers, max_pending=self.max_pending, pending=self.pending)
+
+    def server_close(self):
+        ThreadingHTTPServer.server_close(self)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+def make_server(host='127.0.0.1', port=8030, workers=None, max_pending=None,
+                max_upload_bytes=100*1024**2, verbose=False):
+    '''
+    Make (and warm up) a render service, ready to `.serve_forever()`.
+
+    Parameters
+    ----------
+    host : str
+        The address to listen on (by default, only this computer).
+    port : int
+        The port to listen on (0 picks a free one, which is
+        then available as `server.server_address[1]`).
+    workers : int
+        How many worker processes? (default is one per CPU)
+    max_pending : int
+        How many requests can be rendering or waiting to, before
+        new ones are turned away with 503? (default is 4 per worker)
+    max_upload_bytes : int
+        How big can each request be?
+    verbose : bool
+        Should every request be logged?
+
+    Returns
+    -------
+    server : RenderServer
+        The server. Call `.shutdown()` (from another thread) to stop
+        it serving, and `.server_close()` to stop the workers.
+    '''
+    return RenderServer((host, port), workers=workers, max_pending=max_pending,
+                        max_upload_bytes=max_upload_bytes, verbose=verbose)
+
+def main(args=None):
+    '''
+    Run the render service from the command line.
+    (This is the `two-eyes-server` script.)
+    '''
+
+    parser = optparse.OptionParser(usage = """
+    two-eyes-server [options]
+
+Serve stereographs over HTTP, from a pool of warm workers.
+POST left/right images (as a multipart form) to /render?output=anaglyph""")
+    parser.add_option('--host', dest='host', default='127.0.0.1',
+        help = 'address to listen on [default: %default]')
+    parser.add_option('--port', dest='port', type='int', default=8030,
+        help = 'port to listen on [default: %default]')
+    parser.add_option('-w', '--workers', dest='workers', type='int', default=None,
+        help = 'number of worker processes [default: one per CPU]')
+    parser.add_option('-q', '--max-pending', dest='max_pending', type='int', default=None,
+        help = 'requests that can wait before new ones are turned away [default: 4 per worker]')
+    parser.add_option('--max-upload', dest='max_upload', type='float', default=100,
+        help = 'largest request to accept, in MB [default: %default]')
+    options, args = parser.parse_args(args)
+
+    server = make_server(options.host, options.port, workers=options.workers,
+                         max_pending=options.max_pending,
+                         max_upload_bytes=int(options.max_upload*1024**2), verbose=True)
+    print(f'Serving stereographs at http://{options.host}:{server.server_address[1]}/render '
+          f'with {server.workers} workers (press ctrl-c to stop).')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,14 @@
 from .iplot import *
+from .align import estimate_offset
+from .instrument import NullTracer
+from . import compose
+from .animate import prepare_frames, animation_formats
+from .pyramid import write_pyramid
+from .disparity import estimate_disparity, disparity_to_image
+from .cache import ResultCache, hash_file, hash_bytes
+from .encode import preset_extension, preset_options
+from .version import __version__
+import collections
 
 __all__ = ['Stereo']
 def add_number_to_filename(filename, i):
@@ -6,34 +16,266 @@ def add_number_to_filename(filename, i):
     components[-2] += f'-{i:03.0f}'
     return '.'.join(components)
 
+# keep track of the highest number used for each of the most
+# recently used base filenames, so we rarely have to search
+# through a crowded directory more than once
+filename_counters = collections.OrderedDict()
+max_filename_counters = 1024
+filename_lock = threading.Lock()
+
+def find_highest_number(filename):
+    '''
+    Find the highest number already used for a base filename,
+    with one scan of its directory (or -1 if none has been used).
+    '''
+    directory, base = os.path.split(filename)
+    components = base.split('.')
+    before, after = '.'.join(components[:-1]), '.' + components[-1]
+    pattern = re.compile(re.escape(before) + r'-(\d+)' + re.escape(after) + '$')
+    highest = -1
+    try:
+        with os.scandir(directory or '.') as entries:
+            for entry in entries:
+                match = pattern.match(entry.name)
+                if match is not None:
+                    highest = max(highest, int(match.group(1)))
+    except FileNotFoundError:
+        pass
+    return highest
+
 def create_safe_filename(filename):
-    i = 0
-    safe_filename = add_number_to_filename(filename, i)
-    while os.path.exists(safe_filename):
-        i += 1
-        safe_filename = add_number_to_filename(filename, i)
-    return safe_filename
+    '''
+    Claim a new numbered version of a filename (like `image-007.jpg`).
+
+    The file is created (empty) as it is claimed, using an exclusive
+    create, so no other thread or process can claim the same name.
+    The next number after the last one claimed (or `-000`, for a new
+    base filename) is tried first, and only if it's taken is the
+    directory scanned for the highest number already used.
+    '''
+    key = os.path.abspath(filename)
+    with filename_lock:
+        number = filename_counters.pop(key, -1) + 1
+        scanned = False
+        while True:
+            safe_filename = add_number_to_filename(filename, number)
+            try:
+                os.close(os.open(safe_filename, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                # (it's taken, so skip past the highest number used,
+                # or if someone else just got there first, the next one)
+                if scanned:
+                    number += 1
+                else:
+                    number = max(number, find_highest_number(filename)) + 1
+                    scanned = True
+
+        # remember this number (forgetting the least recently used base filenames)
+        filename_counters[key] = number
+        while len(filename_counters) > max_filename_counters:
+            filename_counters.popitem(last=False)
+        return safe_filename
+
+def choose_extension(sink, extension):
+    '''
+    Figure out the file extension for an output, which comes
+    from the sink if it's a filename (or is `extension` otherwise).
+    '''
+    if (sink is None) or hasattr(sink, 'write') or (isinstance(sink, str) and (sink in ['bytes', 'image', 'array'])):
+        return extension
+    return os.path.splitext(os.fspath(sink))[-1].lower().strip('.')
+
+def register_heif():
+    '''
+    Teach PIL to read HEIF/HEIC images (if `pillow_heif` is installed).
+    This is done only when first needed, because it's slow to import.
+
+    Returns
+    -------
+    registered : bool
+        Is HEIF support available?
+    '''
+    global heif_registered
+    if heif_registered is None:
+        try:
+            from pillow_heif import register_heif_opener
+            register_heif_opener()
+            heif_registered = True
+        except ImportError:
+            heif_registered = False
+    return heif_registered
+heif_registered = None
+
+def open_image(source):
+    '''
+    Open an image (from a filename or file-like object) with PIL,
+    adding support for HEIF images the first time one shows up.
+    '''
+    try:
+        return Image.open(source)
+    except UnidentifiedImageError:
+        if heif_registered or not register_heif():
+            raise
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return Image.open(source)
+
+def check_array(array):
+    '''
+    Make sure an array can be used as an eye's image, returning
+    it (or a view of it) as a (rows x columns) or (rows x columns x 3)
+    uint8 array. Arrays (and memmaps) are never copied here.
+    '''
+    array = np.asanyarray(array)
+    if array.dtype != np.uint8:
+        raise ValueError(f'images must be uint8 arrays, not {array.dtype}')
+    if (array.ndim == 3) and (array.shape[2] in [1, 4]):
+        array = array[:, :, 0] if array.shape[2] == 1 else array[:, :, :3]
+    if not ((array.ndim == 2) or ((array.ndim == 3) and (array.shape[2] == 3))):
+        raise ValueError(f'images must be (rows x columns) or (rows x columns x 3) arrays, not {array.shape}')
+    return array
+
+def image_size(image):
+    '''
+    Get the (width, height) of a PIL image or an array.
+    '''
+    if isinstance(image, np.ndarray):
+        return image.shape[1], image.shape[0]
+    return image.size
 
+def crop_image(image, box):
+    '''
+    Crop a PIL image or an array (as a view) to a (left, upper, right, lower) box.
+    '''
+    if isinstance(image, np.ndarray):
+        return image[box[1]:box[3], box[0]:box[2]]
+    return image.crop(box)
+
+def overlap_boxes(size, shift):
+    '''
+    Figure out how to crop two eyes of the same (width, height), so that
+    features shifted by `shift` = (x, y) in the right eye line up.
 
+    Returns
+    -------
+    left, right : list
+        The (left, upper, right, lower) box for each eye.
+    '''
+    (width, height), (x, y) = size, shift
+    left = [max(0, -x), max(0, -y), width - max(0, x), height - max(0, y)]
+    right = [max(0, x), max(0, y), width - max(0, -x), height - max(0, -y)]
+    return left, right
+
+# lossless ways to rotate by right angles (counterclockwise, like Image.rotate)
+transposes = {90: Image.Transpose.ROTATE_90,
+              180: Image.Transpose.ROTATE_180,
+              270: Image.Transpose.ROTATE_270}
+
+class EyeImages(dict):
+    '''
+    A dictionary of images for the left and right eyes,
+    which tells its Stereo to forget anything it derived
+    from an eye's image whenever that image is replaced.
+    '''
+    def __init__(self, stereo, *args, **kwargs):
+        self.stereo = stereo
+        dict.__init__(self, *args, **kwargs)
+
+    def __setitem__(self, eye, image):
+        dict.__setitem__(self, eye, image)
+        self.stereo.forget(eye)
+
+    def update(self, *args, **kwargs):
+        for eye, image in dict(*args, **kwargs).items():
+            self[eye] = image
 
 class Stereo:
     '''
     A generic stereographic image.
     '''
-    def __init__(self, left=None, right=None, prefix='stereograph'):
+
+    # which method makes each kind of output, and which
+    # products (see `derive`) does each one need from the eyes?
+    output_methods = dict(sidebyside='to_sidebyside',
+                          crosseyed='to_crosseyed',
+                          overunder='to_overunder',
+                          anaglyph='to_anaglyph',
+                          gif='to_gif',
+                          mpo='to_mpo',
+                          disparity='to_disparity')
+    output_products = dict(sidebyside=['image'],
+                           crosseyed=['image'],
+                           overunder=['image'],
+                           anaglyph=['gray'],
+                           gif=['image'],
+                           mpo=['image'],
+                           disparity=['gray-array'])
+
+    # (when the eyes are arrays, most outputs are made straight from them)
+    array_output_products = dict(sidebyside=['array'],
+                                 crosseyed=['array'],
+                                 overunder=['array'],
+                                 anaglyph=['array'],
+                                 gif=['image'],
+                                 mpo=['image'],
+                                 disparity=['gray-array'])
+
+    # what's each layout of the eyes called in filenames?
+    layout_labels = dict(sidebyside='side-by-side',
+                         crosseyed='cross-eyed',
+                         overunder='over-under')
+
+    # which outputs are single images (that can be made into pyramids)?
+    image_labels = dict(layout_labels, anaglyph='red-cyan', disparity='disparity')
+
+    def __init__(self, left=None, right=None, prefix='stereograph', rotation=0,
+                       verbose=False, tracer=None, cache=None):
         '''
         Initialize a new stereograph.
 
         Parameters
         ----------
-        left : str
-            Filename of the left image.
-        right : str
-            Filename of the right image.
+        left : str, array
+            Filename of the left image, or the image itself as a
+            (rows x columns [x 3]) uint8 array (which can be an
+            `np.memmap`; arrays are used as they are, without copying).
+            If there's no right image, this should be one file with
+            both eyes in it (like an MPO or multi-image HEIF).
+        right : str, array
+            Filename of the right image, or the image itself as an array.
+        prefix : str
+            How should we start the filenames?
+        rotation : float
+            By how many degrees (counterclockwise) should
+            the images be rotated before making outputs?
+        verbose : bool
+            Should progress messages be printed?
+        tracer : twoeyes.instrument.Tracer
+            Something to measure the time (and bytes) spent in
+            each stage. By default, nothing is measured.
+        cache : twoeyes.cache.ResultCache, str
+            A cache of finished outputs (or a directory for one).
+            If the same images have been made into the same output
+            with the same settings before, the cached result is
+            handed back without decoding or encoding anything.
         '''
 
+        # decide whether to talk, whether to measure, and whether to cache
+        self.verbose = verbose
+        self.tracer = tracer or NullTracer()
+        self.cache = ResultCache(cache) if isinstance(cache, str) else cache
+
+        # keep track of where each eye's image came from
+        self.sources = {}
+
+        # create somewhere to keep products derived from the images
+        self.derived_products = {}
+        self.derived_lock = threading.RLock()
+
         # create a dictionary for the left and right images
         self.images = dict(left=None, right=None)
+        self.rotation = rotation
 
         # load the images from their files
         self.load(left, right)
@@ -41,136 +283,1106 @@ class Stereo:
         # store a prefix for saving a filename
         self.prefix = prefix
 
+    @property
+    def images(self):
+        '''
+        The images for the 'left' and 'right' eyes (PIL images, or arrays).
+        '''
+        return self._images
+
+    @images.setter
+    def images(self, images):
+        self._images = EyeImages(self, images)
+        self.forget()
+
+    @property
+    def rotation(self):
+        '''
+        By how many degrees (counterclockwise) are the images rotated?
+        '''
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, rotation):
+        self._rotation = rotation
+
+    def forget(self, eye=None):
+        '''
+        Forget products derived from the images, for one eye (or both).
+        '''
+        with self.derived_lock:
+            for key in list(self.derived_products):
+                if (eye is None) or (key[0] == eye):
+                    del self.derived_products[key]
+
+    def derive(self, eye, product='image', rotation=None):
+        '''
+        Get a product derived from one eye's image.
+
+        Products are remembered, so each is only made once for each
+        eye and rotation. They are forgotten automatically when that
+        eye's image is replaced, or when the rotation changes.
+
+        Parameters
+        ----------
+        eye : str
+            'left' or 'right'
+        product : str
+            'image' = the rotated color PIL image
+            'gray' = the rotated grayscale PIL image
+            'array' = the rotated color image, as a (read-only) numpy array
+            'gray-array' = the rotated grayscale image, as a (read-only) numpy array
+            (If the eye's image is an array, 'array' is that array itself,
+             or a rotated view of it, which should not be changed.)
+            'digest' = a hash of the image (from its file's bytes, if possible)
+        rotation : float
+            The rotation (in degrees) to use, if not `self.rotation`.
+
+        Returns
+        -------
+        derived : PIL.Image or array
+        '''
+        if rotation is None:
+            rotation = self.rotation % 360
+        key = (eye, product, rotation)
+        with self.derived_lock:
+            if key in self.derived_products:
+                return self.derived_products[key]
+
+            # forget products made at old rotations (except the unrotated ones)
+            for other in list(self.derived_products):
+                if other[-1] not in [0, rotation, self.rotation % 360]:
+                    del self.derived_products[other]
+
+            # make the product, building on other products where possible
+            if isinstance(self.images[eye], np.ndarray) and (product != 'digest'):
+                derived = self.derive_from_array(eye, product, rotation)
+            elif (product == 'image') and (rotation == 0):
+                derived = self.decode(eye)
+            elif product == 'image':
+                with self.tracer.stage('rotate', eye=eye, rotation=rotation):
+                    derived = self.rotate_image(self.derive(eye, 'image', 0), rotation)
+            elif (product == 'gray') and (rotation == 0):
+                image = self.decode(eye)
+                with self.tracer.stage('convert', eye=eye, mode='L'):
+                    derived = image.convert('L')
+            elif product == 'gray':
+                with self.tracer.stage('rotate', eye=eye, rotation=rotation):
+                    derived = self.rotate_image(self.derive(eye, 'gray', 0), rotation)
+            elif product == 'digest':
+                derived = self.digest(eye)
+            elif product in ['array', 'gray-array']:
+                image = self.derive(eye, 'image' if product == 'array' else 'gray', rotation)
+                with self.tracer.stage('convert', eye=eye, mode='array'):
+                    derived = np.asarray(image)
+            else:
+                raise ValueError(f"'{product}' is not a product that can be derived")
+            self.derived_products[key] = derived
+            return derived
+
+    def derive_from_array(self, eye, product, rotation):
+        '''
+        Make a product (see `derive`) for an eye whose image is an array,
+        using views of the array (not copies) wherever possible.
+        '''
+        right_angle = rotation in transposes
+        if (product == 'array') and (rotation == 0):
+            derived = self.images[eye]
+        elif (product == 'array') and right_angle:
+            with self.tracer.stage('rotate', eye=eye, rotation=rotation):
+                derived = np.rot90(self.derive(eye, 'array', 0), rotation//90)
+        elif product == 'array':
+            derived = np.asarray(self.derive(eye, 'image', rotation))
+        elif (product == 'gray-array') and (rotation == 0):
+            array = self.images[eye]
+            if array.ndim == 2:
+                derived = array
+            else:
+                with self.tracer.stage('convert', eye=eye, mode='L'):
+                    derived = compose.luminance(array)
+        elif (product == 'gray-array') and right_angle:
+            with self.tracer.stage('rotate', eye=eye, rotation=rotation):
+                derived = np.rot90(self.derive(eye, 'gray-array', 0), rotation//90)
+        elif product == 'gray-array':
+            derived = np.asarray(self.derive(eye, 'gray', rotation))
+        elif product in ['image', 'gray'] and ((rotation == 0) or right_angle):
+            array = self.derive(eye, 'array' if product == 'image' else 'gray-array', rotation)
+            with self.tracer.stage('convert', eye=eye, mode='image'):
+                derived = Image.fromarray(np.ascontiguousarray(array))
+        elif product in ['image', 'gray']:
+            with self.tracer.stage('rotate', eye=eye, rotation=rotation):
+                derived = self.rotate_image(self.derive(eye, product, 0), rotation)
+        else:
+            raise ValueError(f"'{product}' is not a product that can be derived")
+        return derived
+
+    def has_arrays(self):
+        '''
+        Is either eye's image an array (rather than a PIL image)?
+        '''
+        return any(isinstance(self.images[eye], np.ndarray) for eye in ['left', 'right'])
+
+    def decode(self, eye):
+        '''
+        Make sure one eye's image has been decoded (which PIL
+        otherwise waits to do until the pixels are needed).
+        '''
+        image = self.images[eye]
+        if getattr(image, 'tile', None):
+            with self.tracer.stage('decode', eye=eye) as record:
+                image.load()
+                record['bytes_read'] = self.count_bytes(eye)
+        return image
+
+    def digest(self, eye):
+        '''
+        Hash one eye's image. If the image is still the one that was
+        opened from a file (or bytes), the hash comes from those bytes,
+        without decoding; otherwise, it comes from the decoded pixels.
+        '''
+        image = self.images[eye]
+        source_image, source, frame = self.sources.get(eye, (None, None, None))
+        if (image is source_image) and (source is not None):
+            digest = hash_file(source) if isinstance(source, (str, os.PathLike)) else hash_bytes(source)
+            return digest if frame is None else hash_bytes(f'{digest} frame {frame}'.encode())
+        if isinstance(image, np.ndarray):
+            description = f'{image.shape} {image.dtype} '.encode()
+            return hash_bytes(description + hash_bytes(np.ascontiguousarray(image)).encode())
+        description = f'{image.mode} {image.size} '.encode()
+        return hash_bytes(description + self.decode(eye).tobytes())
+
+    def count_bytes(self, eye):
+        '''
+        How many bytes is the file for one eye? (or None, if unknown)
+        '''
+        try:
+            return os.path.getsize(self.filenames[eye])
+        except (TypeError, KeyError, AttributeError, OSError):
+            return None
+
     def load(self, left_filename, right_filename):
         '''
         Load and store images for the left and right eyes.
+
+        (The images are opened here, but PIL waits to
+        decode them until their pixels are needed. Arrays
+        are kept as they are, and .npy files are memory-mapped.
+        If there's no right image, both eyes come from the
+        frames of the left file; see `load_frames`. If there
+        are no images at all, they can be set later, in `.images`.)
         '''
 
-        print('Reading input images.')
+        if (right_filename is None) and (left_filename is None):
+            self.filenames = dict(left=None, right=None)
+            return
+        if right_filename is None:
+            if isinstance(left_filename, np.ndarray):
+                raise ValueError("An array can't hold both eyes, so please give a right image too.")
+            return self.load_frames(left_filename)
+
+        self.write_output('Reading input images.')
         self.filenames = dict(left=left_filename, right=right_filename)
-        print(self.filenames)
 
         # loop over the eyes, loading the image for each
         for eye in ['left', 'right']:
-            print(f"  loading {eye} eye's image from {self.filenames[eye]}")
+            source = self.filenames[eye]
+            if isinstance(source, np.ndarray):
+                self.filenames[eye] = None
+                self.write_output(f"  using {eye} eye's image from a {source.shape} array")
+                self.images[eye] = check_array(source)
+                continue
+            self.write_output(f"  loading {eye} eye's image from {source}")
             # store images in self.images['left'] and self.images['right']
-            self.images[eye] = Image.open(self.filenames[eye])
-            print("   success!")
+            with self.tracer.stage('open', eye=eye, filename=source):
+                if isinstance(source, (str, os.PathLike)) and os.fspath(source).lower().endswith('.npy'):
+                    self.images[eye] = check_array(np.load(source, mmap_mode='r'))
+                else:
+                    self.images[eye] = open_image(source)
+                if isinstance(source, (str, os.PathLike)):
+                    self.sources[eye] = (self.images[eye], source, None)
+            self.write_output("   success!")
 
-    def rotate_image(self, image):
-        return image
+    def load_frames(self, source, frames=(0, 1)):
+        '''
+        Load both eyes from one multi-frame file, like an MPO from
+        a stereo camera, or a multi-image HEIF (from a spatial capture).
 
-    def adjust(self):
-        '''
-        Let user click to identify a feature to line up in both images.
-        '''
-
-        raise NotImplementedError('Still buggy!')
-
-        self.iplot = iplot(1,2,verbose=False,hspace=0,wspace=0)
-        self.iplot.subplot(0,0,name='left')
-        self.iplot.subplot(0,1,name='right')
-        for k in ['left', 'right']:
-            ax = self.iplot.axes[k]
-            ax.imshow(self.__dict__[k], interpolation='nearest')
-            ylim = ax.get_ylim()
-            ax.set_ylim(max(ylim), min(ylim))
-            ax.set_title(k.capitalize())
-            plt.setp(ax.get_yticklabels(), visible=False)
-            plt.setp(ax.get_xticklabels(), visible=False)
-        print(" Please click the same feature in boths images.")
-        print("  (the images will be aligned to match up on this feature, to draw the viewer's focus)")
-        self.referencepoints = {}
-        while(len(self.referencepoints.keys())<2):
-            click = self.iplot.getMouseClicks(1)[0]
-            for k in self.iplot.axes.keys():
-                if self.iplot.axes[k] == click.inaxes:
-                    whicheye = k
-                    self.referencepoints[k] = np.round(np.array([click.xdata, click.ydata])).astype(np.int)
-            print("  You clicked the {0} image at {1}".format(whicheye, self.referencepoints[whicheye]))
-            #self.iplot.axes[whicheye].scatter(*self.referencepoints[whicheye], s=50)
-        nudgex, nudgey = self.referencepoints['right']-self.referencepoints['left']
-
-        print(" Applying a nudge of {0} pixels between the two images.".format((nudgex,nudgey)))
-        left, right = np.array(self.images['left']), np.array(self.images['right'])
-        if nudgex > 0:
-            left = left[:,:-nudgex]
-            right = right[:,nudgex:]
-        else:
-            left = left[:,-nudgex:]
-            right = right[:,:nudgex]
-        if nudgey > 0:
-            left = left[:-nudgey, :]
-            right = right[nudgey:, :]
-        else:
-            left = left[-nudgey:, :]
-            right = right[:nudgey, :]
-        self.images['left'], self.images['right'] = Image.fromarray(left), Image.fromarray(right)
+        Each eye gets its own handle on the file, which is only moved
+        (lazily) to that eye's frame, so neither frame is decoded until
+        an output needs its pixels.
+
+        Parameters
+        ----------
+        source : str, file-like
+            The multi-frame file.
+        frames : tuple
+            Which frames are the (left, right) eyes? Stereo cameras
+            usually store the left eye first.
+        '''
+
+        self.write_output(f'Reading both eyes from frames {frames} of {source}.')
+        self.filenames = dict(left=source, right=source)
+
+        # (a file-like object is read once, and then shared)
+        if hasattr(source, 'read'):
+            source = source.read()
+
+        for eye, frame in zip(['left', 'right'], frames):
+            with self.tracer.stage('open', eye=eye, filename=self.filenames[eye], frame=frame):
+                image = open_image(io.BytesIO(source) if isinstance(source, bytes) else source)
+                n_frames = getattr(image, 'n_frames', 1)
+                if n_frames <= max(frames):
+                    raise ValueError(f"{self.filenames[eye]} has {n_frames} frame(s), so it can't "
+                                     f"provide frames {frames} (please give a right image too)")
+                image.seek(frame)
+                self.images[eye] = image
+                self.sources[eye] = (image, source, frame)
+            self.write_output(f"  found {eye} eye's image in frame {frame}")
+
+    def rotate_image(self, image, rotation=None):
+        '''
+        Rotate an image counterclockwise by `rotation` degrees (or by
+        `self.rotation`), using lossless transposes for right angles.
+        '''
+        if rotation is None:
+            rotation = self.rotation
+        rotation = rotation % 360
+        if (image is None) or (rotation == 0):
+            return image
+        if rotation in transposes:
+            return image.transpose(transposes[rotation])
+        return image.rotate(rotation, expand=True)
+
+    def adjust(self, shift=None, horizontal=True, vertical=True):
+        '''
+        Line up the two eyes, by cropping them so that the
+        scene overlaps as well as possible in both images.
+
+        Parameters
+        ----------
+        shift : tuple
+            The (x, y) shift in pixels of features in the right image
+            relative to the left image. If None, it will be estimated
+            automatically (with `twoeyes.align.estimate_offset`).
+        horizontal : bool
+            Should the horizontal shift be corrected? (This sets
+            which depth in the scene appears at the screen.)
+        vertical : bool
+            Should the vertical shift be corrected?
+
+        Returns
+        -------
+        shift : tuple
+            The (x, y) shift that was estimated (or given), which can be
+            logged, or passed to `adjust` again for another similar pair.
+        '''
+
+        if shift is None:
+            shift = estimate_offset(self.images['left'], self.images['right'])
+        nudgex, nudgey = shift
+        self.write_output(f'Applying a nudge of {(nudgex*horizontal, nudgey*vertical)} pixels between the two images.')
+
+        # crop both images to the region where they overlap
+        left, right = overlap_boxes(image_size(self.images['left']), (nudgex*horizontal, nudgey*vertical))
+        self.images['left'] = crop_image(self.images['left'], left)
+        self.images['right'] = crop_image(self.images['right'], right)
+
+        self.shift = shift
+        return shift
 
     def write_output(self, message):
-        print(message)
+        '''
+        Print a progress message (if `verbose`).
+        '''
+        if self.verbose:
+            print(message)
         
-    def to_sidebyside(self, directory=''):
+    def save_output(self, image, label, extension, directory='', sink=None, cache_settings=None,
+                    preset=None, format=None, **kwargs):
         '''
-        Output stereograph as a side-by-side image pair.
+        Save a stereograph somewhere (or just hand it back).
+
+        Parameters
+        ----------
+        image : PIL.Image, list of PIL.Image
+            The stereograph, or a list of frames for an animation.
+        label : str
+            A label to go into the default filename.
+        extension : str
+            The file extension (and so the format) to use by default.
+        directory : str
+            The directory for the default filename.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the stereograph go?
+                None = a new numbered file in `directory` (the default)
+                a filename = that file
+                a file-like object (anything with `.write`) = written into it
+                'bytes' = return the encoded file as bytes
+                'image' = return the (unencoded) PIL image, or list of frames
+                'array' = return the (unencoded) image as a numpy array
+        cache_settings : dict
+            If there's a cache, store the encoded result in it, under
+            these settings (see `cache_key`).
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`),
+            which can change the file extension and the keywords for PIL.
+        format : str
+            The PIL format to encode with, whatever the extension
+            (by default, the format is chosen by the extension).
+        **kwargs
+            Keywords passed along to PIL's `.save` (overriding the preset's).
+
+        Returns
+        -------
+        output :
+            The filename, file-like object, bytes, image, or array,
+            depending on the `sink`.
         '''
 
-        label = 'side-by-side'
+        frames = image if isinstance(image, list) else [image]
+        if len(frames) > 1:
+            kwargs = dict(save_all=True, append_images=frames[1:], **kwargs)
+
+        # hand back the unencoded image
+        if isinstance(sink, str) and (sink == 'image'):
+            return image
+        if isinstance(sink, str) and (sink == 'array'):
+            # (palette images are expanded to colors, since indices aren't much use)
+            arrays = [np.asarray(f.convert('RGB') if f.mode == 'P' else f) for f in frames]
+            return np.stack(arrays) if isinstance(image, list) else arrays[0]
 
-        # convert images to arrays, but keep them as colors (width x height x 3)
-        left = np.array(self.rotate_image(self.images['left']))
-        right = np.array(self.rotate_image(self.images['right']))
+        # encode into memory
+        extension = choose_extension(sink, preset_extension(preset, extension))
+        format = format or Image.registered_extensions().get(f'.{extension}')
+        if format is None:
+            raise ValueError(f"PIL doesn't know how to save '.{extension}' files.")
+        if (len(frames) > 1) and (format not in Image.SAVE_ALL):
+            raise ValueError(f"'.{extension}' files can't hold all {len(frames)} frames of a {label} stereograph.")
+        kwargs = preset_options(preset, format, **kwargs)
+        with self.tracer.stage('encode', output=label, format=format) as record:
+            buffer = io.BytesIO()
+            frames[0].save(buffer, format=format, **kwargs)
+            encoded = buffer.getbuffer()
+            record['bytes_written'] = len(encoded)
 
-        # construct a comined image by stacking the images side by side
-        combined = Image.fromarray(np.hstack([left,right]))
+        # keep a copy in the cache
+        if (self.cache is not None) and (cache_settings is not None):
+            with self.tracer.stage('cache', output=label, hit=False) as record:
+                self.cache.put(self.cache_key(cache_settings, extension), extension, encoded)
+                record['bytes_written'] = len(encoded)
+        if isinstance(sink, str) and (sink == 'bytes'):
+            return bytes(encoded)
+        return self.write_encoded(encoded, label, extension, directory=directory, sink=sink)
 
-        # save to an image file
-        base_filename = os.path.join(directory, f'{self.prefix}-{label}.jpg')
-        filename = create_safe_filename(base_filename)
-        combined.save(filename)
+    def write_encoded(self, encoded, label, extension, directory='', sink=None):
+        '''
+        Write an encoded stereograph into a file (or a file-like object).
+
+        Parameters
+        ----------
+        encoded : bytes
+            The encoded stereograph.
+        label : str
+            A label to go into the default filename.
+        extension : str
+            The file extension for the default filename.
+        directory : str
+            The directory for the default filename.
+        sink : None, str, file-like
+            None = a new numbered file in `directory` (the default)
+            a filename = that file
+            a file-like object (anything with `.write`) = written into it
+
+        Returns
+        -------
+        output :
+            The filename, or the file-like object.
+        '''
+
+        # write into a file-like object
+        if hasattr(sink, 'write'):
+            with self.tracer.stage('write', output=label) as record:
+                sink.write(encoded)
+                record['bytes_written'] = len(encoded)
+            return sink
+
+        # write into a file
+        with self.tracer.stage('write', output=label) as record:
+            if sink is None:
+                base_filename = os.path.join(directory, f'{self.prefix}-{label}.{extension}')
+                filename = create_safe_filename(base_filename)
+            else:
+                filename = os.fspath(sink)
+            with open(filename, 'wb') as f:
+                f.write(encoded)
+            record['filename'] = filename
+            record['bytes_written'] = len(encoded)
         self.write_output(f'Saved {label} stereograph to {filename}')
         return filename
 
-    def to_anaglyph(self, directory=''):
+    def cache_key(self, settings, extension):
         '''
-        Output stereograph as a red-cyan image pair.
+        Make a cache key for an output of this pair, from the bytes of
+        the images, the rotation, and the settings used to make it.
+        '''
+        digests = [self.derive(eye, 'digest', 0) for eye in ['left', 'right']]
+        return self.cache.key(digests, rotation=self.rotation % 360, extension=extension,
+                              version=__version__, **settings)
+
+    def fetch_cached(self, settings, extension, directory='', sink=None, label=None):
         '''
+        Send an output from the cache to a sink, if it's there.
 
-        # set the label
-        label = 'red-cyan'
+        Parameters
+        ----------
+        settings : dict
+            Everything that affects the output (see `cache_key`).
+        extension : str
+            The file extension (and so the format) to use by default.
+        directory : str
+            The directory for the default filename.
+        sink : None, str, file-like, 'bytes'
+            Where should the output go? (see `save_output`) With the default
+            sink, the cached bytes are copied to a new numbered file in
+            `directory` (since a shared cache may evict its own copy at any
+            time). Unencoded sinks ('image' and 'array') never come from the cache.
+        label : str
+            A label to go into the default filename (default is the `output` setting).
+
+        Returns
+        -------
+        output :
+            Whatever `save_output` would have returned, or None if there
+            wasn't anything in the cache.
+        '''
+        if (self.cache is None) or (isinstance(sink, str) and (sink in ['image', 'array'])):
+            return None
+        extension = choose_extension(sink, extension)
+        label = label or settings.get('output')
+        with self.tracer.stage('cache', output=label, hit=False) as record:
+            encoded = self.cache.read(self.cache_key(settings, extension), extension)
+            record['bytes_read'] = None if encoded is None else len(encoded)
+            record['hit'] = encoded is not None
+        if (encoded is None) or (isinstance(sink, str) and (sink == 'bytes')):
+            return encoded
+        # (a copy is written, so it stays even if the cache evicts its own)
+        return self.write_encoded(encoded, label, extension, directory=directory, sink=sink)
+
+    def compose_layout(self, layout='sidebyside', gap=0, background=0):
+        '''
+        Lay out the two eyes next to each other on one canvas (as a PIL image).
+
+        Parameters
+        ----------
+        layout : str
+            'sidebyside', 'crosseyed', or 'overunder'
+            (see `twoeyes.compose.arrange`).
+        gap : int
+            How many pixels should be left between the eyes?
+        background : int
+            The gray level (0-255) of the gap.
+        '''
+
+        # arrays get written straight into one new array
+        if self.has_arrays():
+            left = self.derive('left', 'array')
+            right = self.derive('right', 'array')
+            # (a grayscale eye next to a color eye has to become color)
+            if left.ndim != right.ndim:
+                left, right = [np.dstack([x]*3) if x.ndim == 2 else x for x in [left, right]]
+            return Image.fromarray(compose.layout(left, right, layout=layout, gap=gap, background=background))
+
+        # images get pasted straight into one new image
+        left = self.derive('left', 'image')
+        right = self.derive('right', 'image')
+        mode = 'L' if (left.mode == 'L') and (right.mode == 'L') else 'RGB'
+        size, corners = compose.arrange([left.size, right.size], layout=layout, gap=gap)
+        canvas = Image.new(mode, size, background if mode == 'L' else (background,)*3)
+        for image, corner in zip([left, right], corners):
+            canvas.paste(image if image.mode in ['L', 'RGB'] else image.convert(mode), corner)
+        return canvas
+
+    def compose_sidebyside(self):
+        '''
+        Make a side-by-side image pair (as a PIL image).
+        '''
+        return self.compose_layout('sidebyside')
+
+    def compose_anaglyph(self):
+        '''
+        Make a red-cyan image pair (as a PIL image).
+        '''
 
-        # first convert images to black and white (width x height)
-        left = np.array(self.rotate_image(self.images['left'].convert('L')))
-        right = np.array(self.rotate_image(self.images['right'].convert('L')))
+        # arrays go straight into the channels of one new array
+        if self.has_arrays():
+            left = self.derive('left', 'array')
+            right = self.derive('right', 'array')
+            if left.shape[:2] != right.shape[:2]:
+                raise ValueError(f'The eyes have different sizes ({left.shape} and {right.shape}).')
+            return Image.fromarray(compose.anaglyph(left, right))
+
+        # first get images in black and white (width x height)
+        left = self.derive('left', 'gray')
+        right = self.derive('right', 'gray')
 
         # construct a combined image by populating the RGB channels
-        merged = np.zeros_like(np.array(self.rotate_image(self.images['left'])))
-        merged[:,:,0] += left
-        merged[:,:,1] += right
-        merged[:,:,2] += right
-        combined = Image.fromarray(merged)
-
-        # save to an image file
-        base_filename = os.path.join(directory, f'{self.prefix}-{label}.jpg')
-        filename = create_safe_filename(base_filename)
-        combined.save(filename)
-        self.write_output(f'Saved {label} stereograph to {filename}')
-        return filename
+        # (merging writes straight into one new image, without numpy copies)
+        return Image.merge('RGB', (left, right, right))
+
+    def compose_animation(self):
+        '''
+        Make the frames of an animation (as a list of PIL images).
+        '''
+
+        # keep the images as they are, just rotated
+        left = self.derive('left', 'image')
+        right = self.derive('right', 'image')
+        return [left, right]
+
+    def to_sidebyside(self, directory='', sink=None, layout='sidebyside', gap=0, background=0,
+                      preset=None, **kwargs):
+        '''
+        Output stereograph as a side-by-side image pair.
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+        layout : str
+            'sidebyside' = left eye on the left (for parallel viewing)
+            'crosseyed' = left eye on the right (for cross-eyed viewing)
+            'overunder' = left eye on top
+        gap : int
+            How many pixels should be left between the eyes?
+        background : int
+            The gray level (0-255) of the gap.
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        if layout not in self.layout_labels:
+            raise ValueError(f"layout must be one of {list(self.layout_labels)}, not '{layout}'")
+        label = self.layout_labels[layout]
+        settings = dict(output=label, gap=gap, background=background, preset=preset, options=kwargs)
+        extension = preset_extension(preset, 'jpg')
+        cached = self.fetch_cached(settings, extension, directory=directory, sink=sink)
+        if cached is not None:
+            return cached
+        with self.tracer.stage('compose', output=label):
+            combined = self.compose_layout(layout, gap=gap, background=background)
+        return self.save_output(combined, label, extension, directory=directory, sink=sink,
+                                cache_settings=settings, preset=preset, **kwargs)
+
+    def to_crosseyed(self, directory='', sink=None, gap=0, background=0, preset=None, **kwargs):
+        '''
+        Output stereograph as a cross-eyed image pair (with the left eye on the right).
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+        gap : int
+            How many pixels should be left between the eyes?
+        background : int
+            The gray level (0-255) of the gap.
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        return self.to_sidebyside(directory=directory, sink=sink, layout='crosseyed', gap=gap, background=background,
+                                  preset=preset, **kwargs)
+
+    def to_overunder(self, directory='', sink=None, gap=0, background=0, preset=None, **kwargs):
+        '''
+        Output stereograph as an over-under image pair (with the left eye on top).
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+        gap : int
+            How many pixels should be left between the eyes?
+        background : int
+            The gray level (0-255) of the gap.
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        return self.to_sidebyside(directory=directory, sink=sink, layout='overunder', gap=gap, background=background,
+                                  preset=preset, **kwargs)
+
+    def to_mpo(self, directory='', sink=None, quality=None, preset=None, **kwargs):
+        '''
+        Output stereograph as a multi-picture object (MPO), the stereo
+        JPEG format used by 3D cameras and viewers, with both eyes in one file.
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+        quality : int
+            The JPEG quality (1-95) for each eye (by default, the
+            preset's, or 95 without one).
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+            Only its MPO keywords are used, since this is always an MPO
+            (even if it's saved to a filename ending in `.jpg`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        if choose_extension(sink, 'mpo') not in ['mpo', 'jpg', 'jpeg']:
+            raise ValueError(f"An MPO can only be saved as '.mpo' (or '.jpg'), not '{os.fspath(sink)}'.")
+        options = preset_options(preset, 'MPO', **kwargs)
+        if quality is not None:
+            options['quality'] = quality
+        options.setdefault('quality', 95)
+        settings = dict(output='stereo', options=options)
+        cached = self.fetch_cached(settings, 'mpo', directory=directory, sink=sink)
+        if cached is not None:
+            return cached
+
+        # the eyes are encoded from the images already decoded for other outputs
+        with self.tracer.stage('compose', output='stereo'):
+            frames = [image if image.mode in ['L', 'RGB'] else image.convert('RGB')
+                      for image in self.compose_animation()]
+        return self.save_output(frames, 'stereo', 'mpo', directory=directory, sink=sink,
+                                cache_settings=settings, format='MPO', **options)
+
+    def to_anaglyph(self, directory='', sink=None, preset=None, **kwargs):
+        '''
+        Output stereograph as a red-cyan image pair.
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        settings = dict(output='red-cyan', preset=preset, options=kwargs)
+        extension = preset_extension(preset, 'jpg')
+        cached = self.fetch_cached(settings, extension, directory=directory, sink=sink)
+        if cached is not None:
+            return cached
+        with self.tracer.stage('compose', output='red-cyan'):
+            combined = self.compose_anaglyph()
+        return self.save_output(combined, 'red-cyan', extension, directory=directory, sink=sink,
+                                cache_settings=settings, preset=preset, **kwargs)
+
+    def disparity(self, max_disparity=None, radius=3, smallest=256, refine=2, workers=None):
+        '''
+        Estimate how far each pixel of the left eye is shifted in the
+        right eye (its disparity, which is larger for nearer things
+        if the pair has been lined up on the background).
+
+        Parameters
+        ----------
+        max_disparity : int
+            The biggest shift (in pixels, either way) to look for.
+            The default is an eighth of the width.
+        radius : int
+            The blocks being matched are (2*radius + 1) pixels square.
+        smallest : int
+            Every shift is tried on a copy of the pair shrunk (by
+            halving) to no bigger than this, and then refined at
+            each bigger scale.
+        refine : int
+            At each bigger scale, try shifts this many pixels
+            either way from those found at the scale below it.
+        workers : int
+            How many threads to use? (default is one per CPU)
 
-    def to_gif(self, directory=''):
+        Returns
+        -------
+        disparity : array
+            A (rows x columns) float32 array, where the feature at column
+            x in the left eye is at column x + disparity in the right eye.
+            (see `twoeyes.disparity.estimate_disparity`)
+        '''
+        left = self.derive('left', 'gray-array')
+        right = self.derive('right', 'gray-array')
+        with self.tracer.stage('disparity', max_disparity=max_disparity):
+            return estimate_disparity(left, right, max_disparity=max_disparity, radius=radius,
+                                      smallest=smallest, refine=refine, workers=workers)
+
+    def to_disparity(self, directory='', sink=None, limits=None, max_disparity=None, radius=3,
+                     smallest=256, refine=2, workers=None, preset=None, **kwargs):
+        '''
+        Output a disparity map, as a grayscale image
+        (where brighter means a bigger disparity).
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+            (For the disparities themselves, use `.disparity()`.)
+        limits : tuple
+            The (lowest, highest) disparity, which become black and white.
+            The default is the 1st and 99th percentiles of the map.
+        max_disparity, radius, smallest, refine, workers
+            How the disparities are estimated (see `.disparity()`).
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        estimate = dict(max_disparity=max_disparity, radius=radius, smallest=smallest,
+                        refine=refine, workers=workers)
+        settings = dict(output='disparity', limits=limits, preset=preset, options=kwargs, **estimate)
+        extension = preset_extension(preset, 'png')
+        cached = self.fetch_cached(settings, extension, directory=directory, sink=sink)
+        if cached is not None:
+            return cached
+        with self.tracer.stage('compose', output='disparity'):
+            image = disparity_to_image(self.disparity(**estimate), limits=limits)
+        return self.save_output(image, 'disparity', extension, directory=directory, sink=sink,
+                                cache_settings=settings, preset=preset, **kwargs)
+
+    def to_animation(self, directory='', sink=None, format='gif', width=None,
+                           colors=256, dither=False, duration=500, preset=None, **kwargs):
+        '''
+        Output stereograph as an animation, flipping between the eyes.
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the animation should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the animation go? (see `save_output`;
+            'image' gives a list of frames, 'array' a stack of them)
+        format : str
+            'gif', 'webp' (animated WebP), or 'apng' (animated PNG)
+        width : int
+            If not None, shrink the frames to this width (in pixels) first.
+        colors : int
+            For 'gif' (or 'apng'), quantize both eyes once against a
+            shared palette with this many colors. For 'apng', None
+            keeps the frames in full color.
+        dither : bool
+            Should the quantized frames be dithered?
+        duration : int
+            How long (in milliseconds) should each frame be shown?
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+            Only its keywords for the animation's format are used.
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        extension = animation_formats[format]['extension']
+        options = dict(animation_formats[format]['save'])
+        options.update(preset_options(preset, Image.registered_extensions()[f'.{extension}']))
+        options.update(duration=duration, loop=0)
+        options.update(kwargs)
+        settings = dict(output='animated', format=format, width=width, colors=colors,
+                        dither=dither, options=options)
+        cached = self.fetch_cached(settings, extension, directory=directory, sink=sink)
+        if cached is not None:
+            return cached
+        with self.tracer.stage('compose', output='animated'):
+            frames = prepare_frames(self.compose_animation(), format=format,
+                                    width=width, colors=colors, dither=dither)
+        return self.save_output(frames, 'animated', extension, directory=directory, sink=sink,
+                                cache_settings=settings, **options)
+
+    def to_gif(self, directory='', sink=None, width=None, preset=None, **kwargs):
         '''
         Output stereograph as an animated gif.
+
+        Parameters
+        ----------
+        directory : str
+            The directory into which the animation should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the animation go? (see `save_output`;
+            'image' gives a list of frames, 'array' a stack of them)
+        width : int
+            If not None, shrink the frames to this width (in pixels) first.
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+            Only its GIF keywords are used.
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
         '''
-        # set the label
-        label = 'animated'
+        return self.to_animation(directory=directory, sink=sink, format='gif', width=width,
+                                 preset=preset, **kwargs)
 
-        # convert images to arrays, but keep them as colors (width x height x 3)
-        left = self.rotate_image(self.images['left'])
-        right = self.rotate_image(self.images['right'])
+    def to_pyramid(self, output='anaglyph', directory='', levels=True, tiles=False, smallest=256,
+                   tile_size=254, overlap=1, extension=None, max_workers=None, preset=None, **kwargs):
+        '''
+        Output a stereograph at many resolutions (each half the size of
+        the one before), and/or as tiles for a deep-zoom web viewer.
 
-        # save to an image file
-        base_filename = os.path.join(directory, f'{self.prefix}-{label}.gif')
-        filename = create_safe_filename(base_filename)
-        left.save(filename, save_all=True, append_images=[right], optimize=True, duration=500, loop=0)
-        self.write_output(f'Saved {label} stereograph to {filename}')
-        return filename
+        The stereograph is composed once, at full resolution, and each
+        smaller level is made from the one above it; then all the levels
+        and tiles are encoded at the same time on a pool of threads.
+
+        Parameters
+        ----------
+        output : str
+            Which kind of stereograph? ('anaglyph', 'sidebyside', 'crosseyed',
+            'overunder', or 'disparity')
+        directory : str
+            The directory into which the files should be saved.
+        levels : bool
+            Should each level be saved as an image of its own? The
+            full-resolution image is saved like any other output (as
+            `{prefix}-red-cyan-000.jpg`), with the smaller levels next
+            to it (as `{prefix}-red-cyan-000-512w.jpg`, ...).
+        tiles : bool
+            Should each level be cut into tiles for a deep-zoom viewer?
+            (as `{prefix}-red-cyan-000_files/`, described by `{prefix}-red-cyan-000.dzi`)
+        smallest : int
+            Only save levels at least this wide (in pixels).
+        tile_size : int
+            The width and height of each tile (not counting the overlap).
+        overlap : int
+            By how many pixels should neighboring tiles overlap?
+        extension : str
+            The file extension (and so the format) to use for every image
+            (by default, the preset's, or 'jpg' without one).
+        max_workers : int
+            How many threads to use for encoding? (default is one per CPU)
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+
+        Returns
+        -------
+        pyramid : dict
+            'levels' = a list of (width, height, filename) for each saved level,
+            'dzi' = the Deep Zoom descriptor (or None), and 'tiles' = how many
+            tiles were saved (see `twoeyes.pyramid.write_pyramid`).
+        '''
+        if output not in self.image_labels:
+            raise ValueError(f"output must be one of {list(self.image_labels)}, not '{output}'")
+        label = self.image_labels[output]
+        extension = extension or preset_extension(preset, 'jpg')
+        format = Image.registered_extensions().get(f'.{extension}')
+        if format is None:
+            raise ValueError(f"PIL doesn't know how to save '.{extension}' files.")
+        kwargs = preset_options(preset, format, **kwargs)
+
+        # compose the stereograph once, at full resolution
+        combined = getattr(self, self.output_methods[output])(sink='image')
+
+        # save every level (and tile) of it
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        filename = create_safe_filename(os.path.join(directory, f'{self.prefix}-{label}.{extension}'))
+        with self.tracer.stage('encode', output=label, filename=filename) as record:
+            pyramid = write_pyramid(combined, filename, levels=levels, tiles=tiles, smallest=smallest,
+                                    tile_size=tile_size, overlap=overlap, max_workers=max_workers, **kwargs)
+            record['bytes_written'] = pyramid['bytes_written']
+        if not levels:
+            os.remove(filename)
+        self.write_output(f"Saved {len(pyramid['levels'])} levels and {pyramid['tiles']} tiles of {label} stereograph to {filename}")
+        return pyramid
+
+    def sweep_planes(self, output='anaglyph'):
+        '''
+        Get the (decoded, rotated) planes that a convergence sweep
+        slices each of its variants out of, made once and remembered.
+        '''
+        if output not in self.layout_labels and output != 'anaglyph':
+            raise ValueError(f"output must be 'anaglyph' or one of {list(self.layout_labels)}, not '{output}'")
+        product = 'gray-array' if output == 'anaglyph' else 'array'
+        left, right = [self.derive(eye, product) for eye in ['left', 'right']]
+        if left.shape[:2] != right.shape[:2]:
+            raise ValueError(f'The eyes have different sizes ({left.shape} and {right.shape}).')
+        # (a grayscale eye next to a color eye has to become color)
+        if left.ndim != right.ndim:
+            left, right = [np.dstack([x]*3) if x.ndim == 2 else x for x in [left, right]]
+        return left, right
+
+    def compose_shifted(self, left, right, shift, output='anaglyph'):
+        '''
+        Compose one variant of a convergence sweep (as an array), from
+        views of the two planes cropped to line up at a (x, y) shift.
+        '''
+        left_box, right_box = overlap_boxes((left.shape[1], left.shape[0]), shift)
+        left, right = crop_image(left, left_box), crop_image(right, right_box)
+        if output == 'anaglyph':
+            return compose.anaglyph(left, right)
+        return compose.layout(left, right, layout=output)
+
+    def sweep(self, shifts, output='anaglyph', directory='', sink=None, vertical=0, max_workers=None,
+              preset=None, **kwargs):
+        '''
+        Output a stereograph at lots of different convergence points
+        (horizontal shifts between the eyes), to choose between them.
+
+        The pair is decoded (and converted) once, every variant is
+        composed from views of those planes (without copying them),
+        and all the variants are encoded at the same time on a pool
+        of threads.
+
+        Parameters
+        ----------
+        shifts : list of int
+            The horizontal shifts (in pixels) to try, as in `adjust`,
+            relative to how the eyes line up now. Positive shifts crop
+            the left edge of the right eye (and the right edge of the left).
+        output : str
+            'anaglyph', 'sidebyside', 'crosseyed', or 'overunder'
+        directory : str
+            The directory into which the images should be saved
+            (as `{prefix}-red-cyan-shift+10-000.jpg`, ...).
+        sink : None, str, file-like, 'bytes', 'image', 'array', or dict
+            Where should the images go? (see `save_output`) This can be
+            a dictionary, to send each shift somewhere different.
+        vertical : int
+            A vertical shift (in pixels) to apply to every variant.
+        max_workers : int
+            How many threads to use? (default is one per CPU)
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+
+        Returns
+        -------
+        results : dict
+            What `save_output` returned, for each shift.
+        '''
+        left, right = self.sweep_planes(output)
+        label = self.image_labels[output]
+        sinks = sink if isinstance(sink, dict) else {shift: sink for shift in shifts}
+        extension = preset_extension(preset, 'jpg')
+
+        def make(shift):
+            variant = f'{label}-shift{shift:+d}'
+            settings = dict(output=label, shift=(shift, vertical), preset=preset, options=kwargs)
+            cached = self.fetch_cached(settings, extension, directory=directory, sink=sinks.get(shift),
+                                       label=variant)
+            if cached is not None:
+                return cached
+            with self.tracer.stage('compose', output=variant):
+                combined = Image.fromarray(self.compose_shifted(left, right, (shift, vertical), output))
+            return self.save_output(combined, variant, extension, directory=directory, sink=sinks.get(shift),
+                                    cache_settings=settings, preset=preset, **kwargs)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(shifts, executor.map(make, shifts)))
+
+    def to_contact_sheet(self, shifts, output='anaglyph', directory='', sink=None, vertical=0,
+                         width=320, columns=None, preset=None, **kwargs):
+        '''
+        Output a quick, low-resolution preview of a convergence sweep,
+        with a small copy of the stereograph at each shift, labeled.
+
+        Parameters
+        ----------
+        shifts : list of int
+            The horizontal shifts (in full-resolution pixels) to try (see `sweep`).
+        output : str
+            'anaglyph', 'sidebyside', 'crosseyed', or 'overunder'
+        directory : str
+            The directory into which the image should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array'
+            Where should the image go? (see `save_output`)
+        vertical : int
+            A vertical shift (in full-resolution pixels) to apply to every variant.
+        width : int
+            Roughly how wide (in pixels) should each eye be on the sheet?
+        columns : int
+            How many variants should go in each row? (default makes the sheet roughly square)
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`).
+        **kwargs
+            Other keywords passed along to PIL's `.save` (overriding the preset's).
+        '''
+        from PIL import ImageDraw
+        label = self.image_labels.get(output, output)
+        extension = preset_extension(preset, 'jpg')
+
+        # shrink each eye once, by averaging blocks of pixels
+        left, right = self.sweep_planes(output)
+        factor = max(1, left.shape[1]//width)
+        with self.tracer.stage('convert', output='contact-sheet', factor=factor):
+            left, right = [np.asarray(Image.fromarray(np.ascontiguousarray(x)).reduce(factor)) for x in [left, right]]
+
+        # compose each variant at low resolution
+        variants = [self.compose_shifted(left, right, (round(shift/factor), round(vertical/factor)), output)
+                    for shift in shifts]
+
+        # lay them out in a grid, with a label on each
+        columns = columns or int(np.ceil(np.sqrt(len(variants))))
+        rows = int(np.ceil(len(variants)/columns))
+        cell = (max(v.shape[1] for v in variants), max(v.shape[0] for v in variants))
+        sheet = Image.new('RGB', (columns*cell[0], rows*cell[1]))
+        draw = ImageDraw.Draw(sheet)
+        for i, (shift, variant) in enumerate(zip(shifts, variants)):
+            x, y = (i % columns)*cell[0], (i//columns)*cell[1]
+            sheet.paste(Image.fromarray(variant), (x, y))
+            draw.text((x + 4, y + 4), f'{shift:+d}px', fill=(255, 255, 255))
+        return self.save_output(sheet, f'{label}-contact-sheet', extension, directory=directory, sink=sink,
+                                preset=preset, **kwargs)
+
+    def to_all(self, outputs=['sidebyside', 'anaglyph', 'gif'], directory='', sink=None, max_workers=None,
+               preset=None):
+        '''
+        Output several kinds of stereograph at once.
+
+        Everything the outputs have in common (decoding, rotating,
+        converting to grayscale) is done once up front, and then the
+        outputs are composed, encoded, and written at the same time
+        on a pool of threads (PIL lets go of the GIL while it encodes).
+
+        Parameters
+        ----------
+        outputs : list of str
+            Which outputs to make? Options are the keys of `output_methods`.
+        directory : str
+            The directory into which outputs should be saved.
+        sink : None, str, file-like, 'bytes', 'image', 'array', or dict
+            Where should the outputs go? (see `save_output`) This can be
+            a dictionary, to send each kind of output somewhere different.
+        max_workers : int
+            How many threads to use? (default is one per output)
+        preset : str
+            The name of an encoder preset (see `twoeyes.encode.encoder_presets`)
+            to use for every output.
+
+        Returns
+        -------
+        results : dict
+            What each `to_*` method returned, for each output.
+        '''
+
+        for kind in outputs:
+            if kind not in self.output_methods:
+                raise ValueError(f"'{kind}' is not one of {list(self.output_methods)}")
+        sinks = sink if isinstance(sink, dict) else {kind: sink for kind in outputs}
+
+        # make the shared products, once (unless they might all
+        # come from the cache, in which case they're made when needed)
+        if self.cache is None:
+            products = self.array_output_products if self.has_arrays() else self.output_products
+            for eye in ['left', 'right']:
+                for product in set(p for kind in outputs for p in products[kind]):
+                    self.derive(eye, product)
+
+        # make the outputs, all at once
+        with ThreadPoolExecutor(max_workers=max_workers or len(outputs)) as executor:
+            futures = {kind: executor.submit(getattr(self, self.output_methods[kind]),
+                                             directory=directory, sink=sinks.get(kind), preset=preset)
+                       for kind in outputs}
+            return {kind: future.result() for kind, future in futures.items()}
@@ -0,0 +1,186 @@
+'''
+Tools for making stereographs from pairs that are too big to
+hold in memory, by working through them one strip of rows at a time.
+
+Inputs are memory-mapped wherever the format allows it (binary
+PPM/PGM files and .npy arrays), so only the rows being worked on
+are ever read from disk. Outputs are written strip by strip into
+a binary PPM/PGM file or a .npy array, so they never need to
+exist in memory all at once either.
+'''
+from .imports import *
+from . import compose
+from .stereo import open_image
+
+__all__ = ['open_raster', 'stream_sidebyside', 'stream_anaglyph']
+
+# how many bytes per megabyte?
+MB = 1024**2
+
+def read_netpbm_header(filename):
+    '''
+    Read the header of a binary PGM (P5) or PPM (P6) file.
+
+    Returns
+    -------
+    magic : bytes
+        Either b'P5' or b'P6'.
+    width, height : int
+        The size of the image, in pixels.
+    offset : int
+        The number of bytes before the pixel data starts.
+    '''
+    with open(filename, 'rb') as f:
+        tokens = []
+        while len(tokens) < 4:
+            line = f.readline()
+            if line == b'':
+                raise ValueError(f'{filename} has an incomplete header')
+            tokens.extend(line.split(b'#')[0].split())
+        magic, width, height, maxval = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+        if magic not in [b'P5', b'P6']:
+            raise ValueError(f'{filename} is not a binary PGM or PPM file')
+        if maxval != 255:
+            raise ValueError(f'{filename} has a maximum value of {maxval}, but only 8-bit images are supported')
+        return magic, width, height, f.tell()
+
+def open_raster(source):
+    '''
+    Get an array for an image, without reading it into memory if possible.
+
+    Parameters
+    ----------
+    source : str, array
+        A filename or an array. Binary PGM/PPM files and .npy files
+        are memory-mapped; any other format PIL understands has to be
+        decoded completely (so it will *not* respect a memory budget).
+
+    Returns
+    -------
+    raster : array
+        A (rows x columns) or (rows x columns x 3) uint8 array.
+    '''
+    if isinstance(source, np.ndarray):
+        return source
+
+    extension = os.path.splitext(source)[-1].lower()
+    if extension == '.npy':
+        return np.load(source, mmap_mode='r')
+    if extension in ['.ppm', '.pgm', '.pnm']:
+        magic, width, height, offset = read_netpbm_header(source)
+        shape = (height, width) if magic == b'P5' else (height, width, 3)
+        return np.memmap(source, dtype=np.uint8, mode='r', offset=offset, shape=shape)
+
+    image = open_image(source)
+    if image.mode not in ['L', 'RGB']:
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+def create_output(filename, shape):
+    '''
+    Create an output file, and return an array into which to write its pixels.
+    '''
+    extension = os.path.splitext(filename)[-1].lower()
+    if extension == '.npy':
+        return np.lib.format.open_memmap(filename, mode='w+', dtype=np.uint8, shape=shape)
+    if extension in ['.ppm', '.pgm', '.pnm']:
+        magic = b'P5' if len(shape) == 2 else b'P6'
+        header = magic + f'\n{shape[1]} {shape[0]}\n255\n'.encode()
+        with open(filename, 'wb') as f:
+            f.write(header)
+            f.truncate(len(header) + int(np.prod(shape)))
+        return np.memmap(filename, dtype=np.uint8, mode='r+', offset=len(header), shape=shape)
+    raise ValueError(f'{filename} must be a .ppm, .pgm, .pnm or .npy file to be written in strips')
+
+def rows_per_strip(bytes_per_row, memory_budget):
+    '''
+    How many rows can we work on at once, within a memory budget (in bytes)?
+    '''
+    return int(max(1, memory_budget // bytes_per_row))
+
+def stream(left, right, filename, kind, memory_budget=64*MB):
+    '''
+    Combine two eyes strip by strip into an output file.
+
+    (See `stream_sidebyside` and `stream_anaglyph`.)
+    '''
+
+    # open both eyes without reading them
+    left, right = open_raster(left), open_raster(right)
+    if left.shape[:2] != right.shape[:2]:
+        raise ValueError(f'The eyes have different sizes ({left.shape} and {right.shape}).')
+    rows, columns = left.shape[:2]
+    channels = 3 if (left.ndim == 3) or (right.ndim == 3) else 1
+
+    # figure out the shape of the output, and how much work each row takes
+    if kind == 'sidebyside':
+        shape = (rows, 2*columns, 3) if channels == 3 else (rows, 2*columns)
+        # (both input rows + one output row)
+        bytes_per_row = 4*columns*channels
+        combine = compose.sidebyside
+    elif kind == 'anaglyph':
+        shape = (rows, columns, 3)
+        # (both input rows + 32-bit luminance sums + one output row)
+        bytes_per_row = 2*columns*channels + 4*columns + 3*columns
+        combine = compose.anaglyph
+    else:
+        raise ValueError(f"kind must be 'sidebyside' or 'anaglyph', not '{kind}'")
+
+    # work through the pair, one strip at a time
+    output = create_output(filename, shape)
+    n = rows_per_strip(bytes_per_row, memory_budget)
+    for start in range(0, rows, n):
+        strip = slice(start, min(start + n, rows))
+        eyes = [np.asarray(x[strip]) for x in [left, right]]
+        if (kind == 'sidebyside') and (channels == 3):
+            # promote a grayscale eye to RGB, if the other eye is in color
+            eyes = [x if x.ndim == 3 else x[:,:,np.newaxis].repeat(3, axis=2) for x in eyes]
+        combine(*eyes, out=output[strip])
+        if isinstance(output, np.memmap):
+            output.flush()
+    del output
+    return filename
+
+def stream_sidebyside(left, right, filename, memory_budget=64*MB):
+    '''
+    Make a side-by-side stereograph, one strip of rows at a time.
+
+    Parameters
+    ----------
+    left, right : str, array
+        Filenames (or arrays) of the left and right images. Binary PPM/PGM
+        and .npy files are memory-mapped, so they are never read in all
+        at once; any other format has to be decoded completely first.
+    filename : str
+        The output file, which must be .ppm/.pgm/.pnm or .npy.
+    memory_budget : int
+        Roughly how many bytes of memory may be used at once for each strip.
+
+    Returns
+    -------
+    filename : str
+        The output file.
+    '''
+    return stream(left, right, filename, 'sidebyside', memory_budget=memory_budget)
+
+def stream_anaglyph(left, right, filename, memory_budget=64*MB):
+    '''
+    Make a red-cyan anaglyph stereograph, one strip of rows at a time.
+
+    Parameters
+    ----------
+    left, right : str, array
+        Filenames (or arrays) of the left and right images. Binary PPM/PGM
+        and .npy files are memory-mapped, so they are never read in all
+        at once; any other format has to be decoded completely first.
+    filename : str
+        The output file, which must be .ppm/.pgm/.pnm or .npy.
+    memory_budget : int
+        Roughly how many bytes of memory may be used at once for each strip.
+
+    Returns
+    -------
+    filename : str
+        The output file.
+    '''
+    return stream(left, right, filename, 'anaglyph', memory_budget=memory_budget)